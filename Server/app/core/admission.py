@@ -0,0 +1,219 @@
+"""Admission control and load shedding for the API.
+
+At most ``ADMISSION_MAX_CONCURRENCY`` API requests run at once; the rest
+wait in a priority queue. Reads are admitted before writes, and writes
+before admin bulk work. A request is shed with ``503`` and ``Retry-After``
+when the queue already holds ``ADMISSION_MAX_QUEUE`` requests of the same or
+higher priority, or when it has waited ``ADMISSION_MAX_WAIT`` seconds. A full
+queue makes room for a more urgent request by shedding its least urgent
+waiter.
+
+Health checks, metrics, static files, the SPA shell and the long-lived
+event stream are never limited. Route priorities can be overridden by path
+prefix, e.g.::
+
+    ADMISSION_ROUTE_PRIORITIES="/api/sync=3,/api/courses=1"
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", "2.0"))
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "1"))
+
+# Lower values are admitted first
+EXEMPT = 0
+READ = 1
+WRITE = 2
+BULK = 3
+
+PRIORITY_NAMES = {EXEMPT: "exempt", READ: "read", WRITE: "write", BULK: "bulk"}
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+EXEMPT_PATHS = {"/status", "/ready", "/metrics", "/api/events"}
+BULK_PREFIXES = ("/api/admin/",)
+
+SHED = metrics.Counter(
+    "http_requests_shed_total",
+    "Requests rejected by admission control.",
+    ("priority", "reason"),
+)
+QUEUE_DEPTH = metrics.Gauge(
+    "admission_queue_depth",
+    "Requests waiting for admission.",
+)
+QUEUE_WAIT = metrics.Histogram(
+    "admission_queue_wait_seconds",
+    "Time admitted requests spent waiting in the queue.",
+    ("priority",),
+)
+
+
+def _parse_route_priorities(value: str) -> Dict[str, int]:
+    priorities = {}
+    for item in value.split(","):
+        prefix, _, priority = item.strip().partition("=")
+        if prefix and priority:
+            priorities[prefix.strip()] = int(priority)
+    return priorities
+
+
+class AdmissionController:
+    """A priority-ordered concurrency limit with a bounded wait queue."""
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_wait: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        # Entries are [priority, seq, future]; settled futures are skipped
+        self._queue: List[list] = []
+        self._seq = itertools.count()
+        self.waiting = 0
+
+    def _waiters(self) -> List[list]:
+        return [entry for entry in self._queue if not entry[2].done()]
+
+    def _make_room(self, priority: int) -> bool:
+        """Shed the least urgent waiter if it is less urgent than priority."""
+        # Drop the entries of requests that already timed out or left
+        waiters = self._waiters()
+        if len(waiters) != len(self._queue):
+            heapq.heapify(waiters)
+            self._queue = waiters
+        if len(waiters) < self.max_queue:
+            return True
+        worst = max(waiters, key=lambda entry: (entry[0], entry[1]))
+        if worst[0] <= priority:
+            return False
+        worst[2].set_result("evicted")
+        return True
+
+    async def acquire(self, priority: int) -> Optional[str]:
+        """Wait for a slot; returns None once admitted, else the shed reason."""
+        if self.active < self.max_concurrency and not self._waiters():
+            self.active += 1
+            return None
+        if not self._make_room(priority):
+            return "queue_full"
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._queue, [priority, next(self._seq), future])
+        timer = loop.call_later(
+            self.max_wait,
+            lambda: future.done() or future.set_result("timeout"),
+        )
+        self.waiting += 1
+        QUEUE_DEPTH.set(self.waiting)
+        started = time.perf_counter()
+        try:
+            reason = await future
+        except asyncio.CancelledError:
+            # The client went away; hand on a slot granted in the meantime
+            if future.done() and not future.cancelled() and future.result() is None:
+                self.release()
+            raise
+        finally:
+            timer.cancel()
+            self.waiting -= 1
+            QUEUE_DEPTH.set(self.waiting)
+        if reason is None:
+            QUEUE_WAIT.observe(
+                time.perf_counter() - started,
+                priority=PRIORITY_NAMES.get(priority, str(priority)),
+            )
+        return reason
+
+    def release(self) -> None:
+        """Pass the slot to the most urgent waiter, or free it."""
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionMiddleware:
+    """Limits concurrent API requests and sheds load under pressure."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        route_priorities: Optional[Dict[str, int]] = None,
+    ):
+        self.app = app
+        self.controller = AdmissionController(max_concurrency, max_queue, max_wait)
+        if route_priorities is None:
+            route_priorities = _parse_route_priorities(
+                os.environ.get("ADMISSION_ROUTE_PRIORITIES", "")
+            )
+        # Longest prefix wins
+        self.route_priorities = sorted(
+            route_priorities.items(), key=lambda item: len(item[0]), reverse=True
+        )
+
+    def priority(self, scope: Scope) -> int:
+        path = scope["path"]
+        if path in EXEMPT_PATHS or not path.startswith("/api/"):
+            return EXEMPT
+        for prefix, priority in self.route_priorities:
+            if path.startswith(prefix):
+                return priority
+        if path.startswith(BULK_PREFIXES):
+            return BULK
+        return READ if scope["method"] in READ_METHODS else WRITE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        priority = self.priority(scope)
+        if priority == EXEMPT:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await self.controller.acquire(priority)
+        if reason is not None:
+            SHED.inc(
+                priority=PRIORITY_NAMES.get(priority, str(priority)), reason=reason
+            )
+            logger.warning(
+                "Shed %s %s (%s, %s in flight, %s queued)",
+                scope["method"],
+                scope["path"],
+                reason,
+                self.controller.active,
+                self.controller.waiting,
+            )
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly."},
+                status_code=503,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
@@ -0,0 +1,103 @@
+"""Per-user cache of read-mostly API responses.
+
+Dashboard loads repeat ``GET /api/enrollments``, ``GET /api/settings`` and
+``GET /api/settings/family`` far more often than any of them changes, so
+their results are kept per uid for
+``RESPONSE_CACHE_TTL`` seconds; the course catalog, the same for everyone,
+has a single entry. The cache is bounded by the JSON size of
+its entries (``RESPONSE_CACHE_MAX_BYTES``) and evicts the least recently
+used entry first.
+
+Routes that change the cached data invalidate the affected users' entries
+directly. The cache is per process, so with several workers another worker
+may serve a stale entry for at most the TTL.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from app.core import metrics
+from app.core.responses import dumps
+
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+)
+
+CATALOG = "catalog"
+ENROLLMENTS = "enrollments"
+FAMILY = "family"
+PROFILE = "profile"
+
+CACHE_REQUESTS = metrics.Counter(
+    "response_cache_requests_total",
+    "Response cache lookups by namespace and result.",
+    ("namespace", "result"),
+)
+CACHE_BYTES = metrics.Gauge(
+    "response_cache_bytes",
+    "Approximate JSON size of the cached responses.",
+)
+
+
+class ResponseCache:
+    """TTL cache of JSON-serializable values, LRU-evicted by total size."""
+
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        # (namespace, key) -> (expires_at, size, value)
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, int, Any]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] <= now:
+                self._remove((namespace, key))
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end((namespace, key))
+        CACHE_REQUESTS.inc(namespace=namespace, result="hit" if entry else "miss")
+        return entry[2] if entry else None
+
+    def set(self, namespace: str, key: Hashable, value: Any) -> None:
+        size = len(dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove((namespace, key))
+            self._entries[(namespace, key)] = (time.monotonic() + self.ttl, size, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+            CACHE_BYTES.set(self.size)
+
+    def invalidate(self, namespace: str, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._remove((namespace, key))
+            CACHE_BYTES.set(self.size)
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Drop every entry, or every entry of one namespace."""
+        with self._lock:
+            for entry_key in list(self._entries):
+                if namespace is None or entry_key[0] == namespace:
+                    self._remove(entry_key)
+            CACHE_BYTES.set(self.size)
+
+    def _remove(self, entry_key: Tuple[str, Hashable]) -> None:
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES)
@@ -0,0 +1,252 @@
+"""Response compression middleware with gzip, brotli and zstd support.
+
+The encoding is negotiated from ``Accept-Encoding`` using the server's
+preference order (``COMPRESSION_ENCODINGS``, default ``br,zstd,gzip``);
+brotli and zstd are only offered when the ``brotli`` / ``zstandard`` packages
+are installed. Bodies smaller than ``COMPRESSION_MIN_SIZE`` bytes, responses
+that already carry a ``Content-Encoding`` (such as precompressed static
+files), partial responses and already-compressed media types are passed
+through untouched.
+
+Streaming responses are compressed chunk by chunk and flushed after every
+chunk, so a client still receives each piece as soon as it is produced.
+"""
+
+import gzip
+import logging
+import os
+import zlib
+from typing import Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli and zstandard are optional
+try:
+    import brotli
+
+    brotli_available = True
+except ImportError:
+    brotli_available = False
+
+try:
+    import zstandard
+
+    zstd_available = True
+except ImportError:
+    zstd_available = False
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "500"))
+DEFAULT_ENCODINGS = os.environ.get("COMPRESSION_ENCODINGS", "br,zstd,gzip")
+
+# Levels chosen for on-the-fly compression: fast, still close to the best ratio
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+EXCLUDED_CONTENT_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/octet-stream",
+    "application/pdf",
+    "text/event-stream",
+)
+
+
+class _GzipStream:
+    def __init__(self):
+        # wbits=31 produces a gzip header and trailer
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+STREAMS = {"gzip": _GzipStream}
+if brotli_available:
+    STREAMS["br"] = _BrotliStream
+if zstd_available:
+    STREAMS["zstd"] = _ZstdStream
+
+
+def compress_body(encoding: str, body: bytes) -> bytes:
+    """Compress a complete body in one go."""
+    if encoding == "gzip":
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    return STREAMS[encoding]().finish(body)
+
+
+def negotiate_encoding(accept_encoding: str, preferred: Sequence[str]) -> Optional[str]:
+    """Pick the first server-preferred encoding that the client accepts."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for encoding in preferred:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible HTTP responses."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = DEFAULT_MIN_SIZE,
+        encodings: Optional[Sequence[str]] = None,
+        excluded_content_types: Sequence[str] = EXCLUDED_CONTENT_TYPES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        if encodings is None:
+            encodings = [e.strip() for e in DEFAULT_ENCODINGS.split(",")]
+        self.encodings = [e for e in encodings if e in STREAMS]
+        self.excluded_content_types = tuple(excluded_content_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = negotiate_encoding(
+            headers.get("accept-encoding", ""), self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(
+            self.app, encoding, self.minimum_size, self.excluded_content_types
+        )
+        await responder(scope, receive, send)
+
+
+class _CompressionResponder:
+    """Compresses one response, deciding on the first body message."""
+
+    def __init__(self, app, encoding, minimum_size, excluded_content_types):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.excluded_content_types = excluded_content_types
+        self.send: Optional[Send] = None
+        self.initial_message: Optional[Message] = None
+        self.passthrough = False
+        self.started = False
+        self.stream = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    def _should_skip(self, message: Message) -> bool:
+        headers = Headers(raw=message["headers"])
+        content_type = headers.get("content-type", "").lower()
+        return (
+            "content-encoding" in headers
+            or message["status"] in (204, 206, 304)
+            or content_type.startswith(self.excluded_content_types)
+        )
+
+    async def send_with_compression(self, message: Message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # Hold the headers until the first body chunk shows the size
+            self.initial_message = message
+            self.passthrough = self._should_skip(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if self.passthrough or message_type != "http.response.body":
+            if not self.started and self.initial_message and not self.passthrough:
+                # e.g. http.response.pathsend: the file goes out as is
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        headers = MutableHeaders(raw=self.initial_message["headers"])
+
+        if not self.started:
+            self.started = True
+            if not more_body:
+                if len(body) >= self.minimum_size:
+                    compressed = compress_body(self.encoding, body)
+                    if len(compressed) < len(body):
+                        headers["Content-Encoding"] = self.encoding
+                        headers["Content-Length"] = str(len(compressed))
+                        message["body"] = compressed
+                headers.add_vary_header("Accept-Encoding")
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            # Streaming response: compress and flush every chunk
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            self.stream = STREAMS[self.encoding]()
+            await self.send(self.initial_message)
+
+        if self.stream is None:
+            await self.send(message)
+            return
+
+        if more_body:
+            message["body"] = self.stream.compress(body)
+        else:
+            message["body"] = self.stream.finish(body)
+        await self.send(message)
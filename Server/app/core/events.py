@@ -0,0 +1,137 @@
+"""In-process publish/subscribe hub for live progress events.
+
+Routes publish an event on the topic of the user it concerns (their uid).
+Each Server-Sent Events connection holds one :class:`Subscription` listening
+to its own uid and to the uids of its family members, so one write fans out
+to every interested connection without any extra Firestore reads.
+
+Every subscription has a bounded queue. A slow consumer that lets it fill up
+does not hold up publishers: its queue is cleared and replaced by a single
+``resync`` event telling the client to catch up through ``/api/sync``.
+
+The hub is per process; with several workers a client only sees events
+published by the worker it is connected to.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15.0
+
+RESYNC_EVENT = "resync"
+
+
+class Event:
+    """A single event delivered to subscribers."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, event_type: str, topic: str, data: Dict[str, Any]):
+        self.id = next(self._ids)
+        self.type = event_type
+        self.topic = topic
+        self.data = data
+
+    def to_sse(self) -> str:
+        """Format the event as a Server-Sent Events message."""
+        payload = json.dumps({"uid": self.topic, **self.data}, default=str)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    """One connection's view of the hub."""
+
+    def __init__(self, uid: str, topics: Iterable[str], maxsize: int = QUEUE_SIZE):
+        self.uid = uid
+        self.topics: Set[str] = set(topics)
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def deliver(self, event: Event) -> None:
+        """Queue an event, collapsing the backlog if the consumer is too slow."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(Event(RESYNC_EVENT, self.uid, {}))
+            logger.warning(
+                "Event queue overflow for user %s, asked client to resync", self.uid
+            )
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        """Wait for the next event, or return ``None`` after ``timeout``."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """Routes published events to the subscriptions of each topic."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, uid: str, topics: Iterable[str]) -> Subscription:
+        """Register a subscription. Must be called from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(uid, topics)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    def add_topic(self, subscription: Subscription, topic: str) -> None:
+        """Start delivering another topic to an existing subscription."""
+        with self._lock:
+            subscription.topics.add(topic)
+            self._subscribers[topic].add(subscription)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def _dispatch(self, event: Event) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.topic, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def publish(self, topic: str, event_type: str, data: Dict[str, Any]) -> None:
+        """
+        Publish an event on a topic. Safe to call from the event loop or
+        from worker threads; a no-op when nobody is listening.
+        """
+        if topic not in self._subscribers or self._loop is None:
+            return
+        event = Event(event_type, topic, data)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._dispatch(event)
+        else:
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+
+
+broker = EventBroker()
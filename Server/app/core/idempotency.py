@@ -0,0 +1,254 @@
+"""Idempotency-Key support for non-idempotent POST routes.
+
+A client that sends ``Idempotency-Key: <unique value>`` on course creation,
+enrollment or a family request gets the stored response back when it
+retries with the same key: the route, and with it every Firestore write and
+the invitation email, runs only once. Keys are scoped to the authenticated
+user and the request path, and remembered for ``IDEMPOTENCY_TTL`` seconds.
+
+* A retry while the first request is still running gets ``409``.
+* Reusing a key with a different body gets ``422``.
+* Only successful (2xx) responses are stored, so failed requests can be
+  retried with the same key.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.request_body import MAX_BODY_SIZE
+from app.core.security import verify_id_token
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+# In-flight markers expire sooner, in case a worker dies mid-request
+IDEMPOTENCY_LOCK_TTL = 60.0
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_ROUTES = [
+    ("POST", re.compile(r"^/api/courses/?$")),
+    ("POST", re.compile(r"^/api/courses/[^/]+/enroll/?$")),
+    ("POST", re.compile(r"^/api/settings/family-request/?$")),
+]
+
+# Headers recomputed for every response rather than replayed
+SKIPPED_HEADERS = {b"content-length", b"date", b"server", b"x-request-id"}
+
+
+class StoredResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class _Entry(NamedTuple):
+    fingerprint: str
+    expires_at: float
+    # None while the first request is still running
+    response: Optional[StoredResponse]
+
+
+class IdempotencyStore:
+    """Responses by idempotency key, evicted by TTL and size."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        # Entries are kept in insertion order, so expired ones sit in front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def begin(self, key: str, fingerprint: str) -> Optional[_Entry]:
+        """Claim ``key``, or return the entry of the request that already did."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                return entry
+            self._entries[key] = _Entry(fingerprint, now + IDEMPOTENCY_LOCK_TTL, None)
+            self._entries.move_to_end(key)
+        return None
+
+    def complete(self, key: str, fingerprint: str, response: StoredResponse) -> None:
+        with self._lock:
+            self._entries[key] = _Entry(
+                fingerprint, time.monotonic() + self.ttl, response
+            )
+            self._entries.move_to_end(key)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+store = IdempotencyStore(IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_ENTRIES)
+
+
+def _is_idempotent_route(scope: Scope) -> bool:
+    return any(
+        scope["method"] == method and pattern.match(scope["path"])
+        for method, pattern in IDEMPOTENT_ROUTES
+    )
+
+
+async def _caller_uid(scope: Scope, headers: Headers) -> Optional[str]:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return (await verify_id_token(scope, token)).get("uid")
+    except Exception:
+        # The route itself answers with 401
+        return None
+
+
+async def _read_body(receive: Receive) -> Tuple[List[Message], Optional[bytes]]:
+    """Buffer the request; the body is None when it is too large to key on."""
+    messages: List[Message] = []
+    size = 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return messages, None
+        size += len(message.get("body", b""))
+        if size > MAX_BODY_SIZE:
+            return messages, None
+        if not message.get("more_body", False):
+            return messages, b"".join(m.get("body", b"") for m in messages)
+
+
+class IdempotencyMiddleware:
+    """Replays stored responses for repeated Idempotency-Key requests."""
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore = store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _is_idempotent_route(scope):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"detail": f"Idempotency-Key must not exceed {MAX_KEY_LENGTH} chars."},
+                status_code=400,
+            )
+            await response(scope, receive, send)
+            return
+
+        messages, body = await _read_body(receive)
+
+        async def replay_receive() -> Message:
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        uid = await _caller_uid(scope, headers)
+        if uid is None or body is None:
+            await self.app(scope, replay_receive, send)
+            return
+
+        key = f"{uid}:{scope['path']}:{idempotency_key}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+        existing = self.store.begin(key, fingerprint)
+        if existing is not None:
+            await self._answer_repeat(existing, fingerprint, scope, receive, send)
+            return
+
+        status_code = 500
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        stored = False
+
+        async def send_and_capture(message: Message) -> None:
+            nonlocal status_code, response_headers, stored
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and 200 <= status_code < 300:
+                    self.store.complete(
+                        key,
+                        fingerprint,
+                        StoredResponse(
+                            status_code,
+                            [
+                                (name, value)
+                                for name, value in response_headers
+                                if name.lower() not in SKIPPED_HEADERS
+                            ],
+                            b"".join(chunks),
+                        ),
+                    )
+                    stored = True
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_and_capture)
+        finally:
+            if not stored:
+                # Let the client retry a failed request with the same key
+                self.store.release(key)
+
+    async def _answer_repeat(
+        self,
+        entry: _Entry,
+        fingerprint: str,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if entry.fingerprint != fingerprint:
+            response = JSONResponse(
+                {"detail": "Idempotency-Key was already used with a different body."},
+                status_code=422,
+            )
+        elif entry.response is None:
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress."},
+                status_code=409,
+                headers={"Retry-After": "1"},
+            )
+        else:
+            logger.info("Replaying stored response for %s", scope["path"])
+            response = Response(entry.response.body, status_code=entry.response.status)
+            response.raw_headers = (
+                [
+                    (name, value)
+                    for name, value in response.raw_headers
+                    if name == b"content-length"
+                ]
+                + entry.response.headers
+                + [(b"idempotent-replayed", b"true")]
+            )
+        await response(scope, receive, send)
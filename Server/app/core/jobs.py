@@ -0,0 +1,104 @@
+"""In-process registry of background jobs and their progress.
+
+Routes that hand work to ``BackgroundTasks`` create a job here first, return
+its id at once, and the worker reports progress through the job object so
+clients can poll ``GET /api/jobs/{job_id}``. Jobs live in memory only and the
+registry keeps the most recent ``MAX_JOBS`` of them.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+MAX_JOBS = 1000
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class Job:
+    """Progress of a single background job."""
+
+    def __init__(self, kind: str, owner_uid: Optional[str] = None, **params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner_uid = owner_uid
+        self.params = params
+        self.status = PENDING
+        self.total: Optional[int] = None
+        self.processed = 0
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+
+    def start(self, total: Optional[int] = None) -> None:
+        with self._lock:
+            self.status = RUNNING
+            self.total = total
+            self.updated_at = time.time()
+
+    def advance(self, count: int = 1) -> None:
+        with self._lock:
+            self.processed += count
+            self.updated_at = time.time()
+
+    def complete(self, result: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self.status = COMPLETED
+            self.result = result
+            self.updated_at = time.time()
+        logger.info(
+            "Job %s (%s) completed: %s items", self.id, self.kind, self.processed
+        )
+
+    def fail(self, error: Exception) -> None:
+        with self._lock:
+            self.status = FAILED
+            self.error = str(error)
+            self.updated_at = time.time()
+        logger.error("Job %s (%s) failed: %s", self.id, self.kind, error)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "params": self.params,
+                "total": self.total,
+                "processed": self.processed,
+                "error": self.error,
+                "result": self.result,
+                "createdAt": self.created_at,
+                "updatedAt": self.updated_at,
+            }
+
+
+_jobs: "OrderedDict[str, Job]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def create_job(kind: str, owner_uid: Optional[str] = None, **params) -> Job:
+    """Register a new pending job."""
+    job = Job(kind, owner_uid, **params)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    """Look up a job by id."""
+    with _jobs_lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,458 @@
+"""Request metrics in the Prometheus text exposition format.
+
+``MetricsMiddleware`` records, per matched route template, a latency
+histogram, a response size histogram and a request counter by status code,
+plus a gauge of requests in flight. ``/metrics`` renders them as Prometheus
+text.
+
+With several workers, set ``METRICS_DIR`` to a directory shared by them: each
+worker then writes a snapshot of its metrics there every
+``METRICS_FLUSH_SECONDS`` and ``/metrics`` sums the snapshots of all workers,
+whichever worker answers the scrape.
+
+When a worker exits, or its snapshot has not been rewritten for
+``METRICS_STALE_SECONDS``, its counters and histograms are folded into
+``archive.json`` in the same directory, which every scrape keeps summing, so
+totals never go backwards across restarts. Its gauges are dropped.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:  # Windows
+    HAS_FCNTL = False
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+METRICS_STALE_SECONDS = float(
+    os.environ.get("METRICS_STALE_SECONDS", str(METRICS_FLUSH_SECONDS * 3))
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, str]) -> str:
+    return json.dumps([str(labels.get(name, "")) for name in labelnames])
+
+
+class _Metric:
+    """Common bookkeeping of a labelled metric."""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._samples: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in self._samples.items()
+            }
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": samples,
+        }
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down."""
+
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._samples[key] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            # Per-bucket counts, then sum and count
+            sample = self._samples.get(key)
+            if sample is None:
+                sample = [0] * (len(self.buckets) + 2)
+                self._samples[key] = sample
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[index] += 1
+                    break
+            sample[-2] += value
+            sample[-1] += 1
+
+    def snapshot(self) -> dict:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class Registry:
+    """All metrics of the process."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+
+registry = Registry()
+
+
+def _merge(snapshots: Iterable[Dict[str, dict]]) -> Dict[str, dict]:
+    """Sum the snapshots of several workers."""
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for key, value in metric["samples"].items():
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif isinstance(value, list):
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["samples"][key] = current + value
+    return merged
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra=()) -> str:
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot: Dict[str, dict]) -> str:
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for key, value in sorted(metric["samples"].items()):
+            label_values = json.loads(key)
+            if metric["type"] != "histogram":
+                labels = _format_labels(labelnames, label_values)
+                lines.append(f"{name}{labels} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"], value):
+                cumulative += count
+                labels = _format_labels(
+                    labelnames, label_values, [("le", _format_value(float(bound)))]
+                )
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _format_labels(labelnames, label_values, [("le", "+Inf")])
+            lines.append(f"{name}_bucket{labels} {value[-1]}")
+            labels = _format_labels(labelnames, label_values)
+            lines.append(f"{name}_sum{labels} {_format_value(float(value[-2]))}")
+            lines.append(f"{name}_count{labels} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# ==================== MULTI-WORKER AGGREGATION ====================
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"metrics-{pid}.json")
+
+
+def write_snapshot() -> None:
+    """Publish this worker's metrics to the shared directory."""
+    if not METRICS_DIR:
+        return
+    path = _snapshot_path(os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else, or signals are unsupported
+        return True
+    return True
+
+
+def _archive_path(name: str = "archive.json") -> str:
+    return os.path.join(METRICS_DIR, name)
+
+
+@contextmanager
+def _archive_lock() -> Iterator[None]:
+    """Serialize access to the archive between the workers of a host."""
+    if not HAS_FCNTL:
+        yield
+        return
+    with open(_archive_path("archive.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_archive() -> Dict[str, dict]:
+    try:
+        with open(_archive_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _archive(snapshot: Dict[str, dict], path: str) -> Dict[str, dict]:
+    """
+    Add a finished worker's counters and histograms to the archive, remove
+    its snapshot and return the new archive. Call with the archive lock held.
+    """
+    kept = {
+        name: metric for name, metric in snapshot.items() if metric["type"] != "gauge"
+    }
+    archive = _merge([_read_archive(), kept])
+    tmp_path = f"{_archive_path()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(archive, f)
+    os.replace(tmp_path, _archive_path())
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return archive
+
+
+def _is_stale(path: str, now: float) -> bool:
+    """Whether a snapshot belongs to a worker that is gone."""
+    pid = os.path.basename(path)[len("metrics-") : -len(".json")]
+    if pid.isdigit() and not _pid_alive(int(pid)):
+        return True
+    return now - os.path.getmtime(path) > METRICS_STALE_SECONDS
+
+
+def collect() -> str:
+    """Metrics of this worker, or of all workers when METRICS_DIR is set."""
+    own = registry.snapshot()
+    if not METRICS_DIR:
+        return render(own)
+
+    snapshots = [own]
+    own_file = os.path.basename(_snapshot_path(os.getpid()))
+    # Held for the whole scan, so a snapshot is never counted both on its
+    # own and in the archive
+    with _archive_lock():
+        archive: Dict[str, dict] = {}
+        try:
+            archive = _read_archive()
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping unreadable metrics archive: %s", e)
+        for name in os.listdir(METRICS_DIR):
+            if not name.startswith("metrics-") or not name.endswith(".json"):
+                continue
+            if name == own_file:
+                continue
+            path = os.path.join(METRICS_DIR, name)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+                if _is_stale(path, time.time()):
+                    archive = _archive(snapshot, path)
+                    logger.info("Archived metrics snapshot %s", name)
+                    continue
+                snapshots.append(snapshot)
+            except FileNotFoundError:
+                # Removed by its worker while shutting down
+                continue
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable metrics snapshot %s: %s", name, e)
+        snapshots.append(archive)
+    return render(_merge(snapshots))
+
+
+class _SnapshotWriter(threading.Thread):
+    def __init__(self):
+        super().__init__(name="metrics-writer", daemon=True)
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(METRICS_FLUSH_SECONDS):
+            try:
+                write_snapshot()
+            except OSError as e:
+                logger.warning("Could not write metrics snapshot: %s", e)
+
+
+_writer: Optional[_SnapshotWriter] = None
+
+
+def start_snapshot_writer() -> None:
+    """Start publishing snapshots when running with a shared METRICS_DIR."""
+    global _writer
+    if not METRICS_DIR or _writer is not None:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _writer = _SnapshotWriter()
+    _writer.start()
+
+
+def stop_snapshot_writer() -> None:
+    """Stop publishing and move this worker's totals to the archive."""
+    global _writer
+    if _writer is None:
+        return
+    _writer.stopped.set()
+    _writer.join()
+    _writer = None
+    try:
+        with _archive_lock():
+            _archive(registry.snapshot(), _snapshot_path(os.getpid()))
+    except (OSError, ValueError) as e:
+        logger.warning("Could not archive metrics snapshot: %s", e)
+
+
+# ==================== HTTP METRICS ====================
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by route.",
+    ("method", "route"),
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of HTTP response bodies by route.",
+    ("method", "route"),
+    buckets=SIZE_BUCKETS,
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status code.",
+    ("method", "route", "status"),
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served.",
+    ("method",),
+)
+
+
+def route_label(scope: Scope) -> str:
+    """Matched route template, keeping label cardinality bounded."""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    if isinstance(scope.get("endpoint"), StaticFiles):
+        return "static"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Records latency, size, status and concurrency of HTTP requests."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        size = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec(method=method)
+            route = route_label(scope)
+            REQUEST_LATENCY.observe(elapsed, method=method, route=route)
+            RESPONSE_SIZE.observe(size, method=method, route=route)
+            REQUESTS.inc(method=method, route=route, status=str(status_code))
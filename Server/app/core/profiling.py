@@ -0,0 +1,226 @@
+"""On-demand and continuous sampling profiles.
+
+An admin can profile a single request by sending ``X-Profile: 1`` (or the
+``?profile=1`` query flag). :class:`ProfilingMiddleware` checks the bearer
+token's admin claim, samples the event loop thread for the duration of the
+request and writes the result to ``PROFILE_DIR`` in the collapsed-stack
+format read by flamegraph.pl, speedscope and inferno. The file name is
+returned in the ``X-Profile`` response header and can be downloaded from
+``/api/admin/profiles/{name}``.
+
+Setting ``PROFILE_CONTINUOUS_HZ`` (e.g. ``2``) also samples every thread at
+that low rate in the background and writes the aggregated profile of each
+``PROFILE_FLUSH_SECONDS`` window to disk.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.logging_config import get_request_id
+from app.core.security import verify_admin, verify_id_token
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.002"))
+PROFILE_CONTINUOUS_HZ = float(os.environ.get("PROFILE_CONTINUOUS_HZ", "0"))
+PROFILE_FLUSH_SECONDS = float(os.environ.get("PROFILE_FLUSH_SECONDS", "60"))
+
+PROFILE_HEADER = "X-Profile"
+
+# Request ids come from the client's X-Request-ID header; only these
+# characters reach a profile's file name
+UNSAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_-]")
+MAX_REQUEST_ID_LENGTH = 64
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """Root-first, semicolon-separated stack of a frame."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of one thread (or all threads) on a timer."""
+
+    def __init__(self, interval: float, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_id is not None and thread_id != self.thread_id:
+                    continue
+                self.counts[_collapse(frame)] += 1
+            self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def drain(self) -> Counter:
+        """Take the stacks collected so far and start a new window."""
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+            self.samples = 0
+        return counts
+
+
+def write_folded(counts: Counter, name: str) -> Optional[str]:
+    """Write collapsed stacks to PROFILE_DIR and return the file name."""
+    if not counts:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "w") as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+    return name
+
+
+def profile_name() -> str:
+    """Server-side file name for a request profile, tagged with its request id."""
+    name = f"request-{int(time.time() * 1000)}"
+    request_id = UNSAFE_NAME_RE.sub("", get_request_id() or "")
+    if request_id:
+        name += f"-{request_id[:MAX_REQUEST_ID_LENGTH]}"
+    return f"{name}.folded"
+
+
+async def _is_admin_request(scope: Scope, headers: Headers) -> bool:
+    authorization = headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        return bool(verify_admin(await verify_id_token(scope, token)))
+    except Exception:
+        return False
+
+
+class ProfilingMiddleware:
+    """Profiles single requests flagged by an admin."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        flagged = headers.get(PROFILE_HEADER.lower()) == "1" or (
+            QueryParams(scope.get("query_string", b"")).get("profile") == "1"
+        )
+        if not flagged or not await _is_admin_request(scope, headers):
+            await self.app(scope, receive, send)
+            return
+
+        name = profile_name()
+        sampler = StackSampler(PROFILE_INTERVAL, threading.get_ident())
+
+        async def send_with_profile(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[PROFILE_HEADER] = name
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            sampler.stop()
+            samples = sampler.samples
+            written = write_folded(sampler.drain(), name)
+            logger.info(
+                "Profiled %s %s: %s samples -> %s",
+                scope["method"],
+                scope["path"],
+                samples,
+                written,
+            )
+
+
+class _ContinuousProfiler(threading.Thread):
+    """Low-rate sampling of every thread, flushed to disk periodically."""
+
+    def __init__(self, hz: float):
+        super().__init__(name="continuous-profiler", daemon=True)
+        self.sampler = StackSampler(1.0 / hz)
+        self.stopped = threading.Event()
+
+    def flush(self) -> None:
+        name = f"continuous-{os.getpid()}-{int(time.time())}.folded"
+        try:
+            write_folded(self.sampler.drain(), name)
+        except OSError as e:
+            logger.warning("Could not write continuous profile: %s", e)
+
+    def run(self) -> None:
+        self.sampler.start()
+        while not self.stopped.wait(PROFILE_FLUSH_SECONDS):
+            self.flush()
+        self.sampler.stop()
+        self.flush()
+
+
+_continuous: Optional[_ContinuousProfiler] = None
+
+
+def start_continuous_profiling() -> None:
+    """Start background sampling when PROFILE_CONTINUOUS_HZ is set."""
+    global _continuous
+    if PROFILE_CONTINUOUS_HZ <= 0 or _continuous is not None:
+        return
+    _continuous = _ContinuousProfiler(PROFILE_CONTINUOUS_HZ)
+    _continuous.start()
+    logger.info("Continuous profiling at %s Hz", PROFILE_CONTINUOUS_HZ)
+
+
+def stop_continuous_profiling() -> None:
+    """Stop background sampling and write the last window."""
+    global _continuous
+    if _continuous is None:
+        return
+    _continuous.stopped.set()
+    _continuous.join()
+    _continuous = None
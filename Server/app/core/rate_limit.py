@@ -0,0 +1,308 @@
+"""Token-bucket rate limiting per user, client IP and route.
+
+Routes opt in with a dependency naming their rule::
+
+    @router.post("/courses", dependencies=[Depends(rate_limit("courses-write"))])
+
+Authenticated routes are limited per uid, and per client IP with
+``RATE_LIMIT_IP_MULTIPLIER`` times the budget, since several users can
+share an address. ``rate_limit(name, per_user=False)`` limits by IP alone,
+for routes that take no token. Rules read ``<requests>/<s|m|h>`` and can be
+overridden with ``RATE_LIMIT_RULES``, e.g.::
+
+    RATE_LIMIT_RULES="family-request=10/h,progress=60/m"
+
+Buckets live in process memory by default. With several workers, set
+``RATE_LIMIT_STORE=sqlite`` to share them through the SQLite file at
+``RATE_LIMIT_DB``; any store with the same ``take`` method (a Redis client
+script, for one) can be swapped in through :func:`set_store`. A request is
+checked against all of its buckets at once and only takes tokens when every
+one of them allows it, so a denied request costs nothing.
+
+Behind a load balancer every request arrives from the proxy's address. List
+the proxies in ``RATE_LIMIT_TRUSTED_PROXIES`` (comma-separated addresses)
+and the client IP is taken from ``X-Forwarded-For`` instead: the rightmost
+address not itself a trusted proxy. ``*`` trusts any peer as a single proxy
+hop and takes the rightmost address, the one that proxy saw.
+
+Checks can block on the SQLite store, so the dependencies are plain
+functions that FastAPI runs in the threadpool.
+
+Responses carry ``RateLimit-Limit``, ``RateLimit-Remaining`` and
+``RateLimit-Reset``; rejected requests get 429 with ``Retry-After``.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from app.core.security import get_current_user
+
+RATE_LIMIT_STORE = os.environ.get("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_DB = os.environ.get("RATE_LIMIT_DB", "ratelimit.db")
+RATE_LIMIT_IP_MULTIPLIER = int(os.environ.get("RATE_LIMIT_IP_MULTIPLIER", "10"))
+TRUSTED_PROXIES = {
+    address.strip()
+    for address in os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "").split(",")
+    if address.strip()
+}
+MAX_MEMORY_BUCKETS = 100_000
+
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+DEFAULT_RULES = {
+    "default": "60/m",
+    "courses-write": "30/m",
+    "enroll": "30/m",
+    "progress": "120/m",
+    "settings": "30/m",
+    "sync": "60/m",
+    "batch": "30/m",
+    "family-request": "5/h",
+    "accept-invitation": "20/h",
+}
+
+
+class Rule(NamedTuple):
+    """A bucket of ``capacity`` tokens refilled over ``period`` seconds."""
+
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> "Rule":
+        count, _, unit = value.strip().partition("/")
+        return cls(int(count), PERIODS[unit.strip()[:1] or "s"])
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    # Seconds until a token is available (when denied) or the bucket is full
+    retry_after: float
+    reset: float
+
+
+def _refill(tokens: float, updated: float, now: float, rule: Rule) -> float:
+    return min(rule.capacity, tokens + (now - updated) * rule.rate)
+
+
+def _take_all(
+    levels: Sequence[float], buckets: Sequence[Tuple[str, Rule]], cost: float
+) -> Tuple[List[float], List[Decision]]:
+    """
+    Take ``cost`` from every bucket if each one holds it, else from none.
+    Returns the new levels and one decision per bucket.
+    """
+    take = all(tokens >= cost for tokens in levels)
+    new_levels, decisions = [], []
+    for tokens, (_, rule) in zip(levels, buckets):
+        allowed = tokens >= cost
+        if take:
+            tokens -= cost
+        retry_after = 0.0 if allowed else (cost - tokens) / rule.rate
+        reset = (rule.capacity - tokens) / rule.rate
+        new_levels.append(tokens)
+        decisions.append(Decision(allowed, int(tokens), retry_after, reset))
+    return new_levels, decisions
+
+
+class MemoryStore:
+    """Buckets of this worker, least recently used evicted first."""
+
+    def __init__(self, max_buckets: int = MAX_MEMORY_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(
+        self, buckets: Sequence[Tuple[str, Rule]], cost: float = 1
+    ) -> List[Decision]:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, rule in buckets:
+                tokens, updated = self._buckets.pop(key, (rule.capacity, now))
+                levels.append(_refill(tokens, updated, now, rule))
+            levels, decisions = _take_all(levels, buckets, cost)
+            for (key, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return decisions
+
+
+class SQLiteStore:
+    """Buckets shared by every worker on the host through one SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(
+        self, buckets: Sequence[Tuple[str, Rule]], cost: float = 1
+    ) -> List[Decision]:
+        # Wall clock, since monotonic clocks are not shared between processes
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for key, rule in buckets:
+                row = conn.execute(
+                    "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated = row if row else (rule.capacity, now)
+                levels.append(_refill(tokens, updated, now, rule))
+            levels, decisions = _take_all(levels, buckets, cost)
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                [(key, tokens, now) for (key, _), tokens in zip(buckets, levels)],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return decisions
+
+
+def _parse_rules(value: str) -> Dict[str, Rule]:
+    rules = {name: Rule.parse(rule) for name, rule in DEFAULT_RULES.items()}
+    for item in value.split(","):
+        name, _, rule = item.strip().partition("=")
+        if name and rule:
+            rules[name.strip()] = Rule.parse(rule)
+    return rules
+
+
+RULES = _parse_rules(os.environ.get("RATE_LIMIT_RULES", ""))
+
+_store = None
+
+
+def get_store():
+    """The configured bucket store, created on first use."""
+    global _store
+    if _store is None:
+        _store = (
+            SQLiteStore(RATE_LIMIT_DB)
+            if RATE_LIMIT_STORE == "sqlite"
+            else MemoryStore()
+        )
+    return _store
+
+
+def set_store(store) -> None:
+    """Replace the bucket store, e.g. with a Redis-backed one."""
+    global _store
+    _store = store
+
+
+def client_ip(request: Request) -> str:
+    """The client address, looking through trusted proxies."""
+    peer = request.client.host if request.client else "unknown"
+    trust_any = "*" in TRUSTED_PROXIES
+    if not trust_any and peer not in TRUSTED_PROXIES:
+        return peer
+    forwarded = [
+        address.strip()
+        for address in request.headers.get("x-forwarded-for", "").split(",")
+        if address.strip()
+    ]
+    if not forwarded:
+        return peer
+    # Proxies append the address they saw, so read from the right; anything
+    # left of the last trusted hop was written by the client
+    if trust_any:
+        return forwarded[-1]
+    for address in reversed(forwarded):
+        if address not in TRUSTED_PROXIES:
+            return address
+    return forwarded[0]
+
+
+def _check(name: str, rule: Rule, keys, response: Response, cost: int = 1) -> None:
+    """Take ``cost`` tokens from every bucket or none; the tightest sets the headers."""
+    buckets = [(f"{name}:{key}", key_rule) for key, key_rule in keys]
+    decisions = get_store().take(buckets, cost)
+    tightest: Optional[Decision] = None
+    for decision, (_, key_rule) in zip(decisions, buckets):
+        if not decision.allowed:
+            retry_after = str(max(1, math.ceil(decision.retry_after)))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please slow down.",
+                headers={
+                    "Retry-After": retry_after,
+                    "RateLimit-Limit": str(key_rule.capacity),
+                    "RateLimit-Remaining": "0",
+                    "RateLimit-Reset": retry_after,
+                },
+            )
+        if tightest is None or decision.remaining < tightest.remaining:
+            tightest = decision
+    response.headers["RateLimit-Limit"] = str(rule.capacity)
+    response.headers["RateLimit-Remaining"] = str(tightest.remaining)
+    response.headers["RateLimit-Reset"] = str(math.ceil(tightest.reset))
+
+
+def rate_limit(name: str = "default", per_user: bool = True):
+    """Dependency enforcing the rule ``name`` for the calling user and IP."""
+    rule = RULES.get(name, RULES["default"])
+
+    if not per_user:
+
+        def limit_by_ip(request: Request, response: Response) -> None:
+            _check(name, rule, [(f"ip:{client_ip(request)}", rule)], response)
+
+        return limit_by_ip
+
+    def limit_by_user(
+        request: Request, response: Response, current_user=Depends(get_current_user)
+    ) -> None:
+        charge(name, current_user.get("uid"), request, response)
+
+    return limit_by_user
+
+
+def charge(
+    name: str, uid: str, request: Request, response: Response, cost: int = 1
+) -> None:
+    """
+    Take ``cost`` tokens of rule ``name`` from the user's and the client IP's
+    buckets, raising 429 when either is empty. Blocks on the SQLite store,
+    so call it from the threadpool.
+    """
+    rule = RULES.get(name, RULES["default"])
+    ip_rule = Rule(rule.capacity * RATE_LIMIT_IP_MULTIPLIER, rule.period)
+    _check(
+        name,
+        rule,
+        [(f"uid:{uid}", rule), (f"ip:{client_ip(request)}", ip_rule)],
+        response,
+        cost,
+    )
@@ -0,0 +1,77 @@
+"""Size-limited, typed JSON request body parsing.
+
+``json_body(Model)`` returns a dependency that reads the request body chunk
+by chunk, rejects it with 413 as soon as it grows past ``MAX_BODY_SIZE``
+(or straight away when ``Content-Length`` already says so), and validates
+the raw bytes with Pydantic's Rust JSON parser without building an
+intermediate ``dict``.
+"""
+
+import os
+from typing import Type, TypeVar
+
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+
+MAX_BODY_SIZE = int(os.environ.get("MAX_BODY_SIZE", str(64 * 1024)))
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+async def read_limited_body(request: Request, max_size: int = MAX_BODY_SIZE) -> bytes:
+    """Read the request body, failing fast once it exceeds ``max_size`` bytes."""
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Request body must not exceed {max_size} bytes.",
+    )
+
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        try:
+            if int(content_length) > max_size:
+                raise too_large
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid Content-Length header.",
+            )
+
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_size:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _describe(error: ValidationError) -> str:
+    """Turn the first validation error into a short client-facing message."""
+    first = error.errors()[0]
+    if first["type"] == "json_invalid":
+        return "Request body is not valid JSON."
+    field = str(first["loc"][0]) if first["loc"] else "body"
+    if first["type"] == "missing":
+        return f"Missing required field: {field}"
+    return f"Invalid field {field}: {first['msg']}"
+
+
+def json_body(model: Type[ModelT], max_size: int = MAX_BODY_SIZE):
+    """Dependency parsing the request body into ``model``."""
+
+    async def dependency(request: Request) -> ModelT:
+        body = await read_limited_body(request, max_size)
+        if not body:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Request body is required.",
+            )
+        try:
+            return model.model_validate_json(body)
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=_describe(e)
+            )
+
+    return dependency
@@ -0,0 +1,347 @@
+"""In-process scheduler for periodic background jobs.
+
+Jobs are registered on ``scheduler`` and run by the application lifespan,
+either every N seconds (``add_interval``) or on a five-field cron expression
+evaluated in UTC (``add_cron``). Each job runs in the threadpool, never
+overlaps with itself, and can be delayed by a random jitter so that workers
+do not all hit Firestore at the same instant.
+
+Jobs that must run once per deployment rather than once per worker are
+registered with ``leader_only=True``: only the worker holding an exclusive
+lock on ``SCHEDULER_LOCK_FILE`` runs them, and another worker takes over
+when the leader exits. The lock is per host, so with several hosts each one
+elects its own leader and leader-only jobs must stay idempotent.
+
+On shutdown no new runs start and running jobs get
+``SCHEDULER_DRAIN_TIMEOUT`` seconds to finish.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core import metrics
+
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:  # Windows
+    HAS_FCNTL = False
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_LOCK_FILE = os.environ.get(
+    "SCHEDULER_LOCK_FILE",
+    os.path.join(tempfile.gettempdir(), "ai-academy-scheduler.lock"),
+)
+SCHEDULER_DRAIN_TIMEOUT = float(os.environ.get("SCHEDULER_DRAIN_TIMEOUT", "10"))
+
+JOB_RUNS = metrics.Counter(
+    "scheduler_job_runs_total",
+    "Scheduled job runs by job and result.",
+    ("job", "result"),
+)
+JOB_DURATION = metrics.Histogram(
+    "scheduler_job_duration_seconds",
+    "Duration of scheduled job runs.",
+    ("job",),
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+JOB_LAST_SUCCESS = metrics.Gauge(
+    "scheduler_job_last_success_timestamp_seconds",
+    "Unix time of the last successful run of each job.",
+    ("job",),
+)
+
+
+# ==================== CRON ====================
+
+
+class CronSchedule:
+    """
+    A standard five-field cron expression: minute, hour, day of month, month
+    and day of week (0 or 7 is Sunday). Fields accept ``*``, values, ranges,
+    steps and lists, e.g. ``*/15 2-4 * * 1,3``.
+    """
+
+    _FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        fields = [
+            self._parse_field(part, low, high)
+            for part, (low, high) in zip(parts, self._FIELDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {day % 7 for day in weekdays}
+        # Cron matches either day field when both are restricted
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            span, _, step = part.partition("/")
+            if span == "*":
+                start, end = low, high
+            elif "-" in span:
+                start, end = (int(value) for value in span.split("-", 1))
+            else:
+                start = end = int(span)
+                if step:
+                    end = high
+            if not low <= start <= end <= high:
+                raise ValueError(f"Cron field {field!r} outside {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _matches_day(self, moment: datetime) -> bool:
+        in_month = moment.day in self.days
+        # datetime counts Monday as 0, cron counts Sunday as 0
+        in_week = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return in_week
+        if self._any_weekday:
+            return in_month
+        return in_month or in_week
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching minute strictly after ``moment``."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                month = candidate.month % 12 + 1
+                year = candidate.year + (candidate.month == 12)
+                candidate = candidate.replace(
+                    year=year, month=month, day=1, hour=0, minute=0
+                )
+            elif not self._matches_day(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+# ==================== LEADER LOCK ====================
+
+
+class LeaderLock:
+    """Exclusive, non-blocking file lock held by one worker at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.held = False
+        self._file = None
+
+    def try_acquire(self) -> bool:
+        """Take the lock if it is free; True while this worker holds it."""
+        if self.held:
+            return True
+        if HAS_FCNTL:
+            lock_file = open(self.path, "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._file = lock_file
+        # Without flock every worker leads; run a single worker there
+        self.held = True
+        logger.info("Worker %s is the scheduler leader", os.getpid())
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self.held = False
+
+
+# ==================== SCHEDULER ====================
+
+
+class Job:
+    """A registered job and the outcome of its last run."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval: Optional[float] = None,
+        cron: Optional[CronSchedule] = None,
+        jitter: float = 0.0,
+        leader_only: bool = False,
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.leader_only = leader_only
+        self.runs = 0
+        self.next_run: Optional[float] = None
+        self.last_run: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def delay(self) -> float:
+        """Seconds until the next run, jitter included."""
+        if self.cron is not None:
+            now = datetime.now(timezone.utc)
+            delay = (self.cron.next_after(now) - now).total_seconds()
+        else:
+            delay = self.interval
+        return delay + random.uniform(0, self.jitter)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "schedule": (
+                self.cron.expression if self.cron else f"every {self.interval:g}s"
+            ),
+            "leaderOnly": self.leader_only,
+            "runs": self.runs,
+            "nextRun": self.next_run,
+            "lastRun": self.last_run,
+            "lastDurationSeconds": self.last_duration,
+            "lastError": self.last_error,
+        }
+
+
+class Scheduler:
+    """Runs registered jobs from the event loop until stopped."""
+
+    def __init__(self, lock_path: str = SCHEDULER_LOCK_FILE):
+        self.jobs: Dict[str, Job] = {}
+        self.lock = LeaderLock(lock_path)
+        self._stopped: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def add_interval(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        seconds: float,
+        jitter: float = 0.0,
+        leader_only: bool = False,
+    ) -> Optional[Job]:
+        """Run ``func`` every ``seconds``; a non-positive interval disables it."""
+        if seconds <= 0:
+            logger.info("Scheduled job %s disabled", name)
+            return None
+        return self._add(
+            Job(name, func, interval=seconds, jitter=jitter, leader_only=leader_only)
+        )
+
+    def add_cron(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        expression: str,
+        jitter: float = 0.0,
+        leader_only: bool = False,
+    ) -> Optional[Job]:
+        """Run ``func`` on a cron expression; an empty expression disables it."""
+        if not expression:
+            logger.info("Scheduled job %s disabled", name)
+            return None
+        return self._add(
+            Job(
+                name,
+                func,
+                cron=CronSchedule(expression),
+                jitter=jitter,
+                leader_only=leader_only,
+            )
+        )
+
+    def _add(self, job: Job) -> Job:
+        # Registering a name again replaces the earlier job
+        self.jobs[job.name] = job
+        return job
+
+    async def run_job(self, job: Job) -> None:
+        """Run ``job`` once now, recording the outcome."""
+        if job.leader_only and not self.lock.try_acquire():
+            JOB_RUNS.inc(job=job.name, result="skipped")
+            return
+
+        started = time.perf_counter()
+        job.last_run = time.time()
+        try:
+            if asyncio.iscoroutinefunction(job.func):
+                await job.func()
+            else:
+                await run_in_threadpool(job.func)
+        except Exception as e:
+            job.last_error = str(e)
+            JOB_RUNS.inc(job=job.name, result="failure")
+            logger.error("Scheduled job %s failed: %s", job.name, e, exc_info=True)
+        else:
+            job.last_error = None
+            JOB_RUNS.inc(job=job.name, result="success")
+            JOB_LAST_SUCCESS.set(time.time(), job=job.name)
+        finally:
+            job.runs += 1
+            job.last_duration = time.perf_counter() - started
+            JOB_DURATION.observe(job.last_duration, job=job.name)
+
+    async def _loop(self, job: Job) -> None:
+        while True:
+            delay = job.delay()
+            job.next_run = time.time() + delay
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            await self.run_job(job)
+
+    def start(self) -> None:
+        """Start every registered job; call from the running event loop."""
+        if not SCHEDULER_ENABLED or self._tasks:
+            return
+        self._stopped = asyncio.Event()
+        self._tasks = [
+            asyncio.ensure_future(self._loop(job)) for job in self.jobs.values()
+        ]
+        logger.info("Scheduler started with %s jobs", len(self._tasks))
+
+    async def stop(self, timeout: float = SCHEDULER_DRAIN_TIMEOUT) -> None:
+        """Start no new runs and give running jobs ``timeout`` seconds."""
+        if not self._tasks:
+            return
+        self._stopped.set()
+        _, running = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in running:
+            task.cancel()
+        if running:
+            logger.warning("Scheduler stopped with %s jobs still running", len(running))
+        self._tasks = []
+        self.lock.release()
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in self.jobs.values()]
+
+
+scheduler = Scheduler()
@@ -2,6 +2,7 @@
 
 import os
 import logging
+from functools import lru_cache
 from typing import Optional, Union, Any, Dict
 from datetime import datetime, timedelta
 
@@ -10,14 +11,16 @@ import firebase_admin
 from firebase_admin import auth
 
 # FastAPI imports
-from fastapi import Depends, HTTPException, Security, status
+from fastapi import Depends, HTTPException, Request, Security, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.types import Scope
 
-# JWT libraries for backward compatibility if needed
-from jose import jwt
-from passlib.context import CryptContext
 from pydantic import ValidationError
 
+from app.core import tracing
+from app.core.logging_config import set_log_uid
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -25,14 +28,39 @@ logger = logging.getLogger(__name__)
 SECRET_KEY = os.environ.get("SECRET_KEY", "ai_academy_dev_secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 14
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Set up Bearer token security for Firebase
 security = HTTPBearer()
 
+# Key in the ASGI scope state holding the verified token of the request
+TOKEN_STATE_KEY = "firebase_token"
+
+
+async def verify_id_token(scope: Scope, token: str) -> Dict[str, Any]:
+    """
+    Verify a Firebase ID token once per request.
+
+    The decoded token, or the error verifying it, is kept in the request's
+    scope state so middleware and the route dependency share one check.
+    Verification runs in the threadpool since it may fetch signing keys.
+    """
+    state = scope.setdefault("state", {})
+    cached = state.get(TOKEN_STATE_KEY)
+    if cached is None or cached[0] != token:
+        try:
+            with tracing.start_span("auth.verify_id_token"):
+                result = await run_in_threadpool(auth.verify_id_token, token)
+        except Exception as e:
+            result = e
+        cached = state[TOKEN_STATE_KEY] = (token, result)
+    if isinstance(cached[1], Exception):
+        raise cached[1]
+    return cached[1]
+
 
 # Firebase Auth functions
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Security(security),
 ) -> Dict[str, any]:
     """
@@ -44,10 +72,12 @@ async def get_current_user(
         # Extract token
         token = credentials.credentials
 
-        # Verify Firebase ID token
-        decoded_token = auth.verify_id_token(token)
+        # Verify Firebase ID token, unless middleware already did
+        decoded_token = await verify_id_token(request.scope, token)
 
-        logger.debug(f"Authenticated user: {decoded_token.get('uid')}")
+        # Tag every log record of this request with the user
+        set_log_uid(decoded_token.get("uid"))
+        logger.debug("Authenticated user: %s", decoded_token.get("uid"))
         return decoded_token
     except auth.InvalidIdTokenError:
         logger.warning("Invalid Firebase ID token")
@@ -71,7 +101,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     except Exception as e:
-        logger.error(f"Authentication error: {e}")
+        logger.error("Authentication error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication failed",
@@ -103,21 +133,33 @@ async def get_admin_user(current_user: Dict[str, any] = Depends(get_current_user
     return current_user
 
 
-# Legacy JWT functions - kept for backward compatibility if needed
+# Legacy JWT functions - kept for backward compatibility if needed.
+# passlib and jose are imported on first use so the Firebase-only app
+# does not pay for them at import time.
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """The bcrypt password context, created on first use."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 def verify_password(plain_password, hashed_password):
     """Verify password against stored hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
     """Hash a password for storage."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: Optional[timedelta] = None
 ) -> str:
     """Create a JWT token for a user."""
+    from jose import jwt
+
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -130,6 +172,8 @@ def create_access_token(
 
 def decode_token(token: str) -> Dict[str, Any]:
     """Decode and validate JWT token."""
+    from jose import jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
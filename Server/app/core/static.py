@@ -0,0 +1,291 @@
+"""Static file serving with precompressed variants and immutable caching.
+
+Vite emits fingerprinted file names such as ``assets/index-DPOEC3yS.js``;
+their content never changes under the same name, so they are sent with a
+one-year ``immutable`` cache lifetime. Everything else must be revalidated
+against its ETag.
+
+:func:`precompress_directory` writes ``.gz`` (and ``.br`` when the brotli
+package is installed) siblings next to every compressible file. It runs at
+startup and can also be run at build time::
+
+    python -m app.core.static static
+
+:class:`PrecompressedStaticFiles` then picks the best variant the client
+accepts. Range requests are always answered from the identity file, and all
+responses are ``FileResponse`` objects, so Starlette handles ``Range`` and the
+server can use sendfile where it supports it.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import sys
+import threading
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import FileResponse, HTMLResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# brotli is optional; gzip variants are always produced
+try:
+    import brotli
+
+    brotli_available = True
+except ImportError:
+    brotli_available = False
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".js",
+    ".mjs",
+    ".css",
+    ".html",
+    ".svg",
+    ".json",
+    ".txt",
+    ".map",
+    ".xml",
+}
+MIN_COMPRESS_SIZE = 1024
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Vite writes hashed files to build.assetsDir as name-<hash>.ext, with an
+# 8-character base64url hash; names like user-settings.js elsewhere are not
+# fingerprinted
+ASSETS_DIRECTORY = "assets"
+FINGERPRINT_RE = re.compile(r"^.+-[A-Za-z0-9_-]{8}(\.[A-Za-z0-9]+)+$")
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def is_fingerprinted(path: str) -> bool:
+    """Whether a file is a hashed build asset."""
+    directory, name = os.path.split(os.path.normpath(path))
+    return os.path.basename(directory) == ASSETS_DIRECTORY and bool(
+        FINGERPRINT_RE.match(name)
+    )
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Parse an Accept-Encoding header, ignoring codings with ``q=0``."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    return accepted
+
+
+def _write_variant(source: str, target: str, compress) -> bool:
+    """Write a compressed copy unless an up-to-date one already exists."""
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return True
+    with open(source, "rb") as f:
+        data = f.read()
+    compressed = compress(data)
+    # Not worth serving a variant that saves nothing
+    if len(compressed) >= len(data):
+        return False
+    tmp_target = f"{target}.tmp"
+    with open(tmp_target, "wb") as f:
+        f.write(compressed)
+    os.replace(tmp_target, target)
+    return True
+
+
+def precompress_directory(directory: str) -> Dict[str, Dict[str, str]]:
+    """
+    Create compressed siblings for every compressible file in ``directory``.
+
+    Returns a mapping of original path to ``{encoding: variant path}``. If the
+    directory is read-only, variants already on disk (from a build step) are
+    still picked up.
+    """
+    compressors = [("gzip", ".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli_available:
+        compressors.insert(0, ("br", ".br", lambda data: brotli.compress(data)))
+
+    variants: Dict[str, Dict[str, str]] = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            if os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            for encoding, suffix, compress in compressors:
+                target = path + suffix
+                try:
+                    written = _write_variant(path, target, compress)
+                except OSError as e:
+                    logger.warning("Could not precompress %s: %s", path, e)
+                    written = os.path.exists(target)
+                if written:
+                    variants.setdefault(os.path.realpath(path), {})[encoding] = target
+    logger.info(
+        "Precompressed variants ready for %s files in %s", len(variants), directory
+    )
+    return variants
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """``StaticFiles`` that serves precompressed variants and cache headers."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.variants: Dict[str, Dict[str, str]] = {}
+
+    def precompress(self) -> None:
+        """Build the compressed variants for this mount's directory."""
+        if self.directory is not None:
+            self.variants = precompress_directory(str(self.directory))
+
+    def _pick_variant(self, full_path, request_headers: Headers) -> Optional[tuple]:
+        if "range" in request_headers:
+            return None
+        variants = self.variants.get(os.path.realpath(full_path))
+        if not variants:
+            return None
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, _ in ENCODINGS:
+            if encoding in variants and encoding in accepted:
+                return encoding, variants[encoding]
+        return None
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {
+            "Cache-Control": (
+                IMMUTABLE_CACHE_CONTROL
+                if is_fingerprinted(str(full_path))
+                else REVALIDATE_CACHE_CONTROL
+            )
+        }
+
+        variant = self._pick_variant(full_path, request_headers)
+        if variant is not None:
+            encoding, variant_path = variant
+            media_type, _ = mimetypes.guess_type(str(full_path))
+            headers["Content-Encoding"] = encoding
+            headers["Vary"] = "Accept-Encoding"
+            response = FileResponse(
+                variant_path,
+                status_code=status_code,
+                media_type=media_type,
+                headers=headers,
+                stat_result=os.stat(variant_path),
+            )
+        else:
+            if os.path.realpath(full_path) in self.variants:
+                headers["Vary"] = "Accept-Encoding"
+            response = FileResponse(
+                full_path,
+                status_code=status_code,
+                headers=headers,
+                stat_result=stat_result,
+            )
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class SPAShell:
+    """
+    The single-page app's ``index.html`` held in memory.
+
+    The file has no template variables, so it is read once, compressed once
+    and answered from memory with a strong ETag for every client-side route.
+    With ``watch`` enabled (development only) the file's mtime is checked on
+    each request and the shell is reloaded when it changes.
+    """
+
+    def __init__(self, path: str, watch: bool = False):
+        self.path = path
+        self.watch = watch
+        self.etag: Optional[str] = None
+        self.bodies: Dict[str, bytes] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Read and compress the shell."""
+        with open(self.path, "rb") as f:
+            body = f.read()
+        bodies = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+        if brotli_available:
+            bodies["br"] = brotli.compress(body)
+        with self._lock:
+            self.bodies = bodies
+            self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            self._mtime = os.path.getmtime(self.path)
+        logger.info("Loaded SPA shell from %s (%s bytes)", self.path, len(body))
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.load()
+
+    def response(self, request: Request) -> Response:
+        """Answer a request for the shell from memory."""
+        if self.watch or self.etag is None:
+            try:
+                self._reload_if_changed()
+            except OSError as e:
+                logger.error("Could not load SPA shell: %s", e)
+        if self.etag is None:
+            return HTMLResponse(
+                "<html><body><h1>Front-end build not found</h1></body></html>",
+                status_code=404,
+            )
+
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        if self.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for encoding, _ in ENCODINGS:
+            if encoding in self.bodies and encoding in accepted:
+                headers["Content-Encoding"] = encoding
+                return HTMLResponse(self.bodies[encoding], headers=headers)
+        return HTMLResponse(self.bodies["identity"], headers=headers)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for target_directory in sys.argv[1:] or ["static"]:
+        precompress_directory(target_directory)
@@ -0,0 +1,305 @@
+"""Lightweight request tracing in the OpenTelemetry span model.
+
+Each request gets a root span from :class:`TracingMiddleware`; stages such
+as token verification, Firestore calls, SMTP sends and JSON serialization
+open child spans with :func:`start_span`::
+
+    with tracing.firestore_span("query", "courses") as span:
+        docs = list(db.collection("courses").stream())
+        span.set_attribute("firestore.doc_count", len(docs))
+
+Finished spans go to the exporter selected by ``TRACE_EXPORTER``:
+
+* unset - tracing is off and spans cost a context manager call;
+* ``memory`` - kept in a bounded in-memory buffer (``memory_exporter``);
+* ``file`` - appended as JSON lines to ``TRACE_FILE`` and flushed every
+  ``TRACE_FLUSH_SECONDS`` by the scheduler.
+
+Incoming W3C ``traceparent`` headers are honoured, so spans join the
+caller's trace, and the response carries the request's ``traceparent``.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "")
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_FLUSH_SECONDS = float(os.environ.get("TRACE_FLUSH_SECONDS", "5"))
+MEMORY_EXPORTER_SIZE = 10000
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation with attributes, part of a trace."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "status",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "OK"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span while tracing is off."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+# ==================== EXPORTERS ====================
+
+
+class InMemorySpanExporter:
+    """Keeps the most recent finished spans in memory."""
+
+    def __init__(self, max_spans: int = MEMORY_EXPORTER_SIZE):
+        self._spans: deque = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+
+    def get_finished_spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        spans = list(self._spans)
+        if trace_id is not None:
+            spans = [span for span in spans if span.trace_id == trace_id]
+        return spans
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+    def flush(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FileSpanExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=64 * 1024)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+memory_exporter = InMemorySpanExporter()
+_exporter: Optional[Any] = None
+
+
+def set_exporter(exporter: Optional[Any]) -> None:
+    """Install the exporter finished spans go to; None turns tracing off."""
+    global _exporter
+    previous, _exporter = _exporter, exporter
+    if previous is not None and previous is not exporter:
+        previous.shutdown()
+
+
+def configure_tracing() -> None:
+    """Select the exporter from TRACE_EXPORTER."""
+    if TRACE_EXPORTER == "memory":
+        set_exporter(memory_exporter)
+    elif TRACE_EXPORTER == "file":
+        set_exporter(FileSpanExporter(TRACE_FILE))
+    elif TRACE_EXPORTER:
+        logger.warning("Unknown TRACE_EXPORTER %r, tracing disabled", TRACE_EXPORTER)
+
+
+def flush_tracing() -> None:
+    """Write out spans still buffered by the exporter."""
+    exporter = _exporter
+    if exporter is not None:
+        exporter.flush()
+
+
+def shutdown_tracing() -> None:
+    """Flush and close the exporter."""
+    set_exporter(None)
+
+
+# ==================== SPANS ====================
+
+
+def current_span() -> Optional[Span]:
+    """Innermost open span of the current request, if any."""
+    return _current_span.get()
+
+
+@contextmanager
+def start_span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    trace_id: Optional[str] = None,
+    parent_id: Optional[str] = None,
+) -> Iterator[Any]:
+    """Time the enclosed block as a child of the current span."""
+    exporter = _exporter
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    span = Span(name, trace_id or os.urandom(16).hex(), parent_id, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+        exporter.export(span)
+
+
+def firestore_span(operation: str, collection: str, doc_count: Optional[int] = None):
+    """Span around one Firestore call on a collection."""
+    attributes = {
+        "db.system": "firestore",
+        "db.operation": operation,
+        "firestore.collection": collection,
+    }
+    if doc_count is not None:
+        attributes["firestore.doc_count"] = doc_count
+    return start_span(f"firestore.{operation}", attributes)
+
+
+def _parse_traceparent(value: Optional[str]):
+    """Trace and parent span ids of a W3C traceparent header."""
+    if not value:
+        return None, None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    return parts[1], parts[2]
+
+
+class TracingMiddleware:
+    """Opens the root span of every HTTP request."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_id = _parse_traceparent(
+            Headers(scope=scope).get("traceparent")
+        )
+        method = scope["method"]
+        with start_span(
+            f"{method} {scope['path']}",
+            {"http.method": method, "http.target": scope["path"]},
+            trace_id=trace_id,
+            parent_id=parent_id,
+        ) as span:
+            size = 0
+
+            async def send_with_trace(message: Message) -> None:
+                nonlocal size
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    MutableHeaders(scope=message)["traceparent"] = (
+                        f"00-{span.trace_id}-{span.span_id}-01"
+                    )
+                elif message["type"] == "http.response.body":
+                    size += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                # Name by route template to keep span names low-cardinality
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.name = f"{method} {route}"
+                    span.set_attribute("http.route", route)
+                span.set_attribute("http.response.bytes", size)
@@ -0,0 +1,73 @@
+"""Startup warm-up of caches, gating the ``/ready`` endpoint.
+
+Each warm-up task runs in the threadpool, all of them concurrently, under a
+shared ``WARMUP_DEADLINE``. The worker reports ready once every task has
+finished or the deadline has passed; a task that failed or ran late only
+means its cache starts cold. ``/status`` stays a pure liveness check.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+WARMUP_DEADLINE = float(os.environ.get("WARMUP_DEADLINE", "10"))
+
+
+def warm_token_keys() -> None:
+    """Fetch Firebase's ID token signing keys into the verifier's HTTP cache."""
+    from firebase_admin import _token_gen, auth
+
+    # The verifier's session honours Cache-Control, so later
+    # verify_id_token calls reuse this response until the keys rotate
+    verifier = auth._get_client(None)._token_verifier
+    verifier.request(url=_token_gen.ID_TOKEN_CERT_URI)
+
+
+class WarmUp:
+    """Runs the warm-up tasks once and records how each one went."""
+
+    def __init__(self):
+        self.ready = False
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    async def _run_one(self, name: str, func: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        try:
+            await run_in_threadpool(func)
+            self.results[name] = {"status": "ok"}
+        except Exception as e:
+            logger.warning("Warm-up of %s failed: %s", name, e)
+            self.results[name] = {"status": "failed", "error": str(e)}
+        self.results[name]["seconds"] = round(time.perf_counter() - started, 3)
+
+    async def run(
+        self, tasks: Dict[str, Callable[[], Any]], deadline: float = WARMUP_DEADLINE
+    ) -> None:
+        self.results = {name: {"status": "running"} for name in tasks}
+        pending = [
+            asyncio.ensure_future(self._run_one(name, func))
+            for name, func in tasks.items()
+        ]
+        _, late = await asyncio.wait(pending, timeout=deadline)
+        for name, result in self.results.items():
+            if result["status"] == "running":
+                result["status"] = "timeout"
+        if late:
+            logger.warning("Warm-up deadline of %ss passed", deadline)
+        self.ready = True
+        logger.info("Warm-up finished: %s", self.results)
+
+    def start(self, tasks: Dict[str, Callable[[], Any]]) -> None:
+        """Run the tasks in the background so the server starts at once."""
+        self.task = asyncio.ensure_future(self.run(tasks))
+
+
+warmup = WarmUp()
@@ -0,0 +1,224 @@
+"""Streaming NDJSON export and batched import of Firestore collections.
+
+Each NDJSON line holds one document::
+
+    {"collection": "courses", "id": "abc123", "data": {...}}
+
+Firestore values with no JSON equivalent are written as one-key objects
+tagged by type: ``{"$date": iso}``, ``{"$ref": path}``, ``{"$bytes": base64}``,
+``{"$geo": [latitude, longitude]}`` and ``{"$vector": [...]}``. Import turns
+them back into the same types; export refuses any other type rather than
+write a value that cannot be read back.
+
+Export pages through each collection with ``start_after`` cursors, so memory
+use stays constant however large the collection is. Import groups lines into
+500-operation batched writes committed by a small thread pool and records a
+checkpoint after every batch, so an interrupted import can resume where it
+stopped.
+"""
+
+import base64
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.vector import Vector
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+EXPORTABLE_COLLECTIONS = ("courses", "enrollments", "users")
+
+# Firestore rejects batches with more than 500 operations
+MAX_BATCH_SIZE = 500
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_WORKERS = 4
+
+
+def _encode_value(value: Any) -> Any:
+    """JSON fallback for Firestore values that are not plain JSON."""
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, firestore.DocumentReference):
+        return {"$ref": value.path}
+    if isinstance(value, bytes):
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, firestore.GeoPoint):
+        return {"$geo": [value.latitude, value.longitude]}
+    if isinstance(value, Vector):
+        return {"$vector": list(value)}
+    raise TypeError(f"Cannot export value of type {type(value).__name__}")
+
+
+def _decode_object(db, obj: Dict[str, Any]) -> Any:
+    """Restore the values tagged by :func:`_encode_value`."""
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+        if "$ref" in obj:
+            return db.document(obj["$ref"])
+        if "$bytes" in obj:
+            return base64.b64decode(obj["$bytes"])
+        if "$geo" in obj:
+            return firestore.GeoPoint(*obj["$geo"])
+        if "$vector" in obj:
+            return Vector(obj["$vector"])
+    return obj
+
+
+def iter_collection(db, name: str, page_size: int = DEFAULT_PAGE_SIZE):
+    """Yield every document of a collection, one page of reads at a time."""
+    query = db.collection(name).order_by("__name__").limit(page_size)
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = list(page.stream())
+        yield from docs
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
+
+def export_ndjson(
+    db, collections: Iterable[str], page_size: int = DEFAULT_PAGE_SIZE
+) -> Iterator[bytes]:
+    """Yield the given collections as NDJSON lines."""
+    for name in collections:
+        exported = 0
+        for doc in iter_collection(db, name, page_size):
+            record = {"collection": name, "id": doc.id, "data": doc.to_dict()}
+            yield (json.dumps(record, default=_encode_value) + "\n").encode("utf-8")
+            exported += 1
+        logger.info("Exported %s documents from %s", exported, name)
+
+
+class NDJSONImporter:
+    """
+    Writes NDJSON records to Firestore through parallel batched writes.
+
+    Batches are committed in order of submission as far as the checkpoint is
+    concerned: the checkpoint only advances once every earlier batch has
+    committed, so resuming never skips an unwritten line.
+    """
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_workers: int = DEFAULT_WORKERS,
+        checkpoint_path: Optional[str] = None,
+        collections: Iterable[str] = EXPORTABLE_COLLECTIONS,
+    ):
+        self.db = db
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_workers = max_workers
+        self.checkpoint_path = checkpoint_path
+        self.collections = set(collections)
+
+        self.skip_lines = self._read_checkpoint()
+        self.lines_seen = 0
+        self.imported = 0
+
+        self._pending: List[Dict[str, Any]] = []
+        self._in_flight = deque()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _read_checkpoint(self) -> int:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as f:
+            content = f.read().strip()
+        try:
+            resumed_at = int(content or 0)
+        except ValueError:
+            raise ValueError(
+                f"Checkpoint {os.path.basename(self.checkpoint_path)} is corrupt; "
+                "delete it to start over"
+            )
+        logger.info("Resuming import after line %s", resumed_at)
+        return resumed_at
+
+    def _write_checkpoint(self, line_number: int) -> None:
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(line_number))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _commit(self, records: List[Dict[str, Any]]) -> int:
+        batch = self.db.batch()
+        for record in records:
+            doc_ref = self.db.collection(record["collection"]).document(record["id"])
+            batch.set(doc_ref, record["data"])
+        batch.commit()
+        return len(records)
+
+    def _wait_oldest(self) -> None:
+        future, last_line = self._in_flight.popleft()
+        self.imported += future.result()
+        self._write_checkpoint(last_line)
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        records, self._pending = self._pending, []
+        future = self._executor.submit(self._commit, records)
+        self._in_flight.append((future, self.lines_seen))
+
+        # Bound the number of batches held in memory
+        while len(self._in_flight) >= self.max_workers:
+            self._wait_oldest()
+
+    def add_line(self, line: bytes) -> None:
+        """Queue one NDJSON line for import."""
+        line_number = self.lines_seen + 1
+        if line_number <= self.skip_lines or not line.strip():
+            self.lines_seen = line_number
+            return
+
+        # A rejected line is not counted, so the checkpoint stops before it
+        record = json.loads(line, object_hook=lambda obj: _decode_object(self.db, obj))
+        if record.get("collection") not in self.collections:
+            raise ValueError(
+                f"Line {line_number}: collection {record.get('collection')!r} "
+                "cannot be imported"
+            )
+        if not record.get("id") or not isinstance(record.get("data"), dict):
+            raise ValueError(f"Line {line_number}: 'id' and 'data' are required")
+
+        self.lines_seen = line_number
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def add_lines(self, lines: Iterable[bytes]) -> None:
+        """Queue several NDJSON lines for import."""
+        for line in lines:
+            self.add_line(line)
+
+    def close(self) -> int:
+        """Commit everything still queued and return the number of documents written."""
+        try:
+            self._flush()
+            while self._in_flight:
+                self._wait_oldest()
+        finally:
+            self._executor.shutdown(wait=True)
+        logger.info("Imported %s documents", self.imported)
+        return self.imported
+
+    def abort(self) -> None:
+        """
+        Drop the records not yet submitted and stop the writers. Batches
+        already committed stay written; the checkpoint still points at the
+        last line before them. Safe to call after :meth:`close`.
+        """
+        self._pending = []
+        self._in_flight.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,69 @@
+"""Cascade cleanup of documents that reference a deleted course."""
+
+import logging
+import os
+import time
+
+from app.core.jobs import Job
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+# Upper bound on deletes per second so cleanup never starves live traffic
+CASCADE_DELETE_RATE = float(os.environ.get("CASCADE_DELETE_RATE", "500"))
+
+
+def delete_course_enrollments(
+    db,
+    course_id: str,
+    job: Job,
+    batch_size: int = MAX_BATCH_SIZE,
+    rate: float = CASCADE_DELETE_RATE,
+) -> int:
+    """
+    Delete every ``enrollments`` document of a course in batched writes.
+
+    Only document references are fetched, one page per batch, and the loop
+    sleeps whenever it gets ahead of ``rate`` deletes per second. Progress is
+    reported on ``job``. Returns the number of enrollments deleted.
+    """
+    job.start()
+    deleted = 0
+    started = time.monotonic()
+    try:
+        query = (
+            db.collection("enrollments")
+            .where("courseId", "==", course_id)
+            .select([])
+            .limit(batch_size)
+        )
+        while True:
+            docs = list(query.stream())
+            if not docs:
+                break
+
+            batch = db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+
+            deleted += len(docs)
+            job.advance(len(docs))
+
+            if len(docs) < batch_size:
+                break
+
+            # Rate limiting: wait until the average rate drops back to the limit
+            if rate > 0:
+                ahead = deleted / rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        job.complete({"deleted": deleted})
+        logger.info("Deleted %s enrollments of course %s", deleted, course_id)
+    except Exception as e:
+        job.fail(e)
+    return deleted
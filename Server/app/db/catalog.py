@@ -0,0 +1,49 @@
+"""Course catalog reads, cached for every user."""
+
+import logging
+import os
+from typing import Any, Dict, List
+
+from app.core import tracing
+from app.core.cache import CATALOG, RESPONSE_CACHE_TTL, response_cache
+from app.db import counters
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# The catalog is the same for everyone, so it has a single cache entry
+ALL_COURSES = "all"
+
+# Reloaded before the cache entry expires, so no request waits on a cold load
+CATALOG_REFRESH_SECONDS = float(
+    os.environ.get("CATALOG_REFRESH_SECONDS", str(RESPONSE_CACHE_TTL * 0.75))
+)
+
+
+def load_catalog(db) -> List[Dict[str, Any]]:
+    """Read every course from Firestore and cache the result."""
+    with tracing.firestore_span("query", "courses") as span:
+        courses = []
+        for doc in db.collection("courses").stream():
+            course_data = doc.to_dict()
+            course_data["id"] = doc.id  # Add document ID as 'id' field
+            # Stats are materialized on the course by the reconciliation job
+            course_data.setdefault("stats", counters.empty_stats())
+            courses.append(course_data)
+        span.set_attribute("firestore.doc_count", len(courses))
+
+    response_cache.set(CATALOG, ALL_COURSES, courses)
+    return courses
+
+
+def get_catalog(db) -> List[Dict[str, Any]]:
+    """Every course, from the cache when it is warm."""
+    courses = response_cache.get(CATALOG, ALL_COURSES)
+    if courses is None:
+        courses = load_catalog(db)
+    return courses
+
+
+def invalidate_catalog() -> None:
+    """Forget the cached catalog after a course changes."""
+    response_cache.invalidate(CATALOG, ALL_COURSES)
@@ -0,0 +1,177 @@
+"""Bulk enrollment of a cohort of learners into one or more courses."""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+
+from app.core.cache import ENROLLMENTS, response_cache
+from app.core.events import broker
+from app.core.jobs import Job
+from app.db import counters
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more than 500 operations
+MAX_BATCH_SIZE = 500
+# Firestore accepts at most 30 values in an "in" filter
+MAX_IN_VALUES = 30
+# Documents per multi-get when checking existing enrollments
+READ_CHUNK_SIZE = 300
+
+COHORT_WRITERS = int(os.environ.get("COHORT_WRITERS", "4"))
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def resolve_emails(db, emails: Iterable[str]) -> Dict[str, str]:
+    """Map registered emails to uids, 30 emails per query."""
+    uids = {}
+    for chunk in _chunks(sorted(set(emails)), MAX_IN_VALUES):
+        query = db.collection("users").where("email", "in", list(chunk))
+        for doc in query.select(["email"]).stream():
+            uids[doc.get("email")] = doc.id
+    return uids
+
+
+def existing_courses(db, course_ids: Iterable[str]) -> List[str]:
+    """Ids of the courses that exist, in one multi-get."""
+    refs = [db.collection("courses").document(course_id) for course_id in course_ids]
+    return [
+        snapshot.id
+        for snapshot in db.get_all(refs, field_paths=["title"])
+        if snapshot.exists
+    ]
+
+
+def existing_enrollments(db, pairs: Sequence[Tuple[str, str]]) -> set:
+    """The (uid, course id) pairs already enrolled, by multi-get of their ids."""
+    enrolled = set()
+    for chunk in _chunks(pairs, READ_CHUNK_SIZE):
+        by_id = {f"{uid}_{course_id}": (uid, course_id) for uid, course_id in chunk}
+        refs = [db.collection("enrollments").document(doc_id) for doc_id in by_id]
+        for snapshot in db.get_all(refs, field_paths=["courseId"]):
+            if snapshot.exists:
+                enrolled.add(by_id[snapshot.id])
+    return enrolled
+
+
+def _commit_enrollments(db, pairs: Sequence[Tuple[str, str]]) -> None:
+    """Create the enrollments of one batch and bump each course counter once."""
+    batch = db.batch()
+    per_course: Dict[str, int] = {}
+    for uid, course_id in pairs:
+        # create fails the whole batch, increments included, if the learner
+        # enrolled since the enrollments were checked
+        batch.create(
+            db.collection("enrollments").document(f"{uid}_{course_id}"),
+            {
+                "userId": uid,
+                "courseId": course_id,
+                "enrolledAt": firestore.SERVER_TIMESTAMP,
+                "progress": 0,
+                "completed": False,
+                "lastAccessed": firestore.SERVER_TIMESTAMP,
+            },
+        )
+        per_course[course_id] = per_course.get(course_id, 0) + 1
+    for course_id, count in per_course.items():
+        counters.add_increment(batch, db, course_id, enrolled=count)
+    batch.commit()
+
+
+def _write_batch(db, pairs: Sequence[Tuple[str, str]]) -> int:
+    """Write one batch of enrollments and return how many were created."""
+    try:
+        _commit_enrollments(db, pairs)
+    except AlreadyExists:
+        # Some learners enrolled on their own meanwhile; write the others
+        enrolled = existing_enrollments(db, pairs)
+        pairs = [pair for pair in pairs if pair not in enrolled]
+        if not pairs:
+            return 0
+        _commit_enrollments(db, pairs)
+
+    response_cache.invalidate(ENROLLMENTS, *{uid for uid, _ in pairs})
+    for uid, course_id in pairs:
+        broker.publish(uid, "enrollment", {"courseId": course_id, "progress": 0})
+    return len(pairs)
+
+
+def enroll_cohort(
+    db,
+    uids: Iterable[str],
+    emails: Iterable[str],
+    course_ids: Sequence[str],
+    job: Job,
+    max_workers: int = COHORT_WRITERS,
+) -> int:
+    """
+    Enroll every given learner in every given course.
+
+    Emails are resolved to uids, pairs that are already enrolled are skipped
+    after a bulk read of their enrollment ids, and the rest are written
+    through ``max_workers`` parallel batched writers. Progress is reported on
+    ``job``. Returns the number of enrollments created.
+    """
+    created = 0
+    try:
+        emails = list(emails)
+        # A repeated course would write the same enrollments twice and
+        # count them twice
+        course_ids = list(dict.fromkeys(course_ids))
+        email_uids = resolve_emails(db, emails) if emails else {}
+        learners = sorted(set(uids) | set(email_uids.values()))
+        courses = existing_courses(db, course_ids)
+
+        pairs = [(uid, course_id) for uid in learners for course_id in courses]
+        enrolled = existing_enrollments(db, pairs)
+        pending = [pair for pair in pairs if pair not in enrolled]
+        job.start(total=len(pending))
+
+        # Leave room in each batch for one counter increment per course
+        batch_size = MAX_BATCH_SIZE - len(courses)
+        errors = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_write_batch, db, chunk): len(chunk)
+                for chunk in _chunks(pending, batch_size)
+            }
+            for future in as_completed(futures):
+                try:
+                    written = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                created += written
+                job.advance(futures[future])
+
+        if errors:
+            raise RuntimeError(
+                f"{len(errors)} of {len(futures)} batches failed: {errors[0]}"
+            )
+
+        job.complete(
+            {
+                "created": created,
+                "alreadyEnrolled": len(enrolled),
+                "unknownEmails": sorted(set(emails) - set(email_uids)),
+                "unknownCourses": sorted(set(course_ids) - set(courses)),
+            }
+        )
+        logger.info(
+            "Cohort enrollment created %s enrollments for %s learners in %s courses",
+            created,
+            len(learners),
+            len(courses),
+        )
+    except Exception as e:
+        job.fail(e)
+    return created
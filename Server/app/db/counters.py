@@ -0,0 +1,203 @@
+"""Sharded enrollment counters and materialized course statistics.
+
+Follows the Firestore distributed-counter pattern: every course owns a
+``stats_shards`` subcollection with ``NUM_SHARDS`` documents, and each write
+increments one randomly chosen shard so concurrent enrollments do not contend
+on a single document. Reading the live value costs ``NUM_SHARDS`` reads no
+matter how many learners are enrolled.
+
+The summed values are also materialized on the course document under
+``stats`` by :func:`reconcile_course_stats`, run by the scheduler on
+``COURSE_STATS_RECONCILE_CRON``, so listing the catalog needs no extra reads
+at all.
+"""
+
+import logging
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+NUM_SHARDS = int(os.environ.get("COURSE_STATS_SHARDS", "10"))
+# Nightly by default; an empty value turns the scheduled run off
+COURSE_STATS_RECONCILE_CRON = os.environ.get(
+    "COURSE_STATS_RECONCILE_CRON", "30 3 * * *"
+)
+SHARDS_COLLECTION = "stats_shards"
+
+# Firestore rejects batches with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+COUNTER_FIELDS = ("enrolled", "completed", "progressSum")
+
+
+def _shards_ref(db, course_id: str):
+    """Return the shard subcollection of a course."""
+    return db.collection("courses").document(course_id).collection(SHARDS_COLLECTION)
+
+
+def _random_shard_ref(db, course_id: str):
+    """Pick one shard document at random to spread write contention."""
+    return _shards_ref(db, course_id).document(str(random.randrange(NUM_SHARDS)))
+
+
+def empty_stats() -> Dict[str, Any]:
+    """Statistics for a course nobody has enrolled in yet."""
+    return {"enrolled": 0, "completed": 0, "averageProgress": 0.0}
+
+
+def _to_stats(totals: Dict[str, float]) -> Dict[str, Any]:
+    """Turn raw counter totals into the payload exposed to clients."""
+    enrolled = int(totals.get("enrolled", 0))
+    completed = int(totals.get("completed", 0))
+    progress_sum = float(totals.get("progressSum", 0))
+    average = round(progress_sum / enrolled, 2) if enrolled > 0 else 0.0
+    return {"enrolled": enrolled, "completed": completed, "averageProgress": average}
+
+
+def add_increment(
+    batch,
+    db,
+    course_id: str,
+    enrolled: int = 0,
+    completed: int = 0,
+    progress: float = 0,
+) -> None:
+    """
+    Queue a counter increment on ``batch``.
+
+    The increment is committed together with the enrollment write that
+    caused it, so the counters never drift on a partial failure.
+    """
+    deltas = {"enrolled": enrolled, "completed": completed, "progressSum": progress}
+    update = {
+        field: firestore.Increment(value) for field, value in deltas.items() if value
+    }
+    if not update:
+        return
+    batch.set(_random_shard_ref(db, course_id), update, merge=True)
+
+
+def get_course_stats(db, course_id: str) -> Dict[str, Any]:
+    """Sum every shard of a course. Costs at most ``NUM_SHARDS`` reads."""
+    totals = {field: 0 for field in COUNTER_FIELDS}
+    for shard in _shards_ref(db, course_id).stream():
+        shard_data = shard.to_dict() or {}
+        for field in COUNTER_FIELDS:
+            totals[field] += shard_data.get(field, 0)
+    return _to_stats(totals)
+
+
+def delete_course_counters(db, course_id: str) -> None:
+    """Remove the shard subcollection, which Firestore keeps after the parent."""
+    batch = db.batch()
+    for shard_id in range(NUM_SHARDS):
+        batch.delete(_shards_ref(db, course_id).document(str(shard_id)))
+    batch.commit()
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _write_reconciled(db, writes: Sequence[Tuple[str, dict, dict]]) -> None:
+    """Commit shard corrections and stats; fails if any course is gone."""
+    batch = db.batch()
+    for course_id, corrections, stats in writes:
+        if corrections:
+            batch.set(_shards_ref(db, course_id).document("0"), corrections, merge=True)
+        # update requires the course to exist, so a deleted course is never
+        # recreated as a stub holding only stats
+        batch.update(db.collection("courses").document(course_id), {"stats": stats})
+    batch.commit()
+
+
+def reconcile_course_stats(db, course_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Recompute every course counter from the enrollments collection.
+
+    The courses, their shards and the enrollments are all read at one
+    point in time. Each course's shard 0 then receives the difference
+    between the enrollment totals and the shard totals at that point as an
+    increment, so increments committed while the job runs are kept rather
+    than overwritten. ``stats`` is materialized on each course document;
+    courses that no longer exist, or are deleted meanwhile, are skipped.
+
+    Returns the number of courses reconciled.
+    """
+    # A moment ago, so the read time is never ahead of the server's clock
+    read_time = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    existing = {
+        doc.id
+        for doc in db.collection("courses").select([]).stream(read_time=read_time)
+    }
+    if course_ids is not None:
+        existing &= set(course_ids)
+    totals = {
+        course_id: {field: 0 for field in COUNTER_FIELDS} for course_id in existing
+    }
+    shard_totals = {
+        course_id: {field: 0 for field in COUNTER_FIELDS} for course_id in existing
+    }
+
+    for shard in db.collection_group(SHARDS_COLLECTION).stream(read_time=read_time):
+        course_totals = shard_totals.get(shard.reference.parent.parent.id)
+        if course_totals is None:
+            continue
+        shard_data = shard.to_dict() or {}
+        for field in COUNTER_FIELDS:
+            course_totals[field] += shard_data.get(field, 0) or 0
+
+    enrollment_docs = (
+        db.collection("enrollments")
+        .select(["courseId", "progress", "completed"])
+        .stream(read_time=read_time)
+    )
+    for doc in enrollment_docs:
+        enrollment_data = doc.to_dict()
+        course_totals = totals.get(enrollment_data.get("courseId"))
+        if course_totals is None:
+            continue
+        course_totals["enrolled"] += 1
+        course_totals["completed"] += 1 if enrollment_data.get("completed") else 0
+        course_totals["progressSum"] += enrollment_data.get("progress", 0) or 0
+
+    writes: List[Tuple[str, dict, dict]] = []
+    for course_id, course_totals in totals.items():
+        corrections = {
+            field: firestore.Increment(
+                course_totals[field] - shard_totals[course_id][field]
+            )
+            for field in COUNTER_FIELDS
+            if course_totals[field] != shard_totals[course_id][field]
+        }
+        writes.append((course_id, corrections, _to_stats(course_totals)))
+
+    reconciled = 0
+    # Up to two writes per course
+    for chunk in _chunks(writes, MAX_BATCH_SIZE // 2):
+        try:
+            _write_reconciled(db, chunk)
+            reconciled += len(chunk)
+            continue
+        except NotFound:
+            pass
+        # A course was deleted after read_time and the batch failed as a
+        # whole; write the rest one course at a time
+        for write in chunk:
+            try:
+                _write_reconciled(db, [write])
+                reconciled += 1
+            except NotFound:
+                logger.info("Skipped course %s deleted during reconcile", write[0])
+
+    logger.info("Reconciled enrollment counters for %s courses", reconciled)
+    return reconciled
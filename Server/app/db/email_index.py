@@ -0,0 +1,90 @@
+"""In-memory index of registered emails to user ids.
+
+Replaces the scan over every ``users`` document that family requests used
+to do. The index is loaded once at startup; an email it does not know yet
+costs one equality query, whose answer is then remembered.
+
+Emails change, and other workers do not see this worker's updates, so a hit
+is confirmed against the user's document before it is returned: one read by
+id instead of a query.
+"""
+
+import logging
+import threading
+from typing import Dict, Optional
+
+from app.core import tracing
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class EmailIndex:
+    """Email to uid mapping of the ``users`` collection."""
+
+    def __init__(self):
+        self._uids: Dict[str, str] = {}
+        # Reverse map, to drop a user's previous email when it changes
+        self._emails: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, db) -> int:
+        """Read the email of every user, and nothing else."""
+        uids = {}
+        with tracing.firestore_span("query", "users") as span:
+            for doc in db.collection("users").select(["email", "uid"]).stream():
+                data = doc.to_dict() or {}
+                if data.get("email"):
+                    uids[data["email"]] = data.get("uid") or doc.id
+            span.set_attribute("firestore.doc_count", len(uids))
+        with self._lock:
+            self._uids = uids
+            self._emails = {uid: email for email, uid in uids.items()}
+            self.loaded = True
+        logger.info("Email index loaded with %s users", len(uids))
+        return len(uids)
+
+    def remember(self, email: Optional[str], uid: Optional[str]) -> None:
+        if email and uid:
+            with self._lock:
+                previous = self._emails.get(uid)
+                if previous != email and self._uids.get(previous) == uid:
+                    del self._uids[previous]
+                self._uids[email] = uid
+                self._emails[uid] = email
+
+    def forget(self, email: str) -> None:
+        with self._lock:
+            uid = self._uids.pop(email, None)
+            if uid is not None and self._emails.get(uid) == email:
+                del self._emails[uid]
+
+    def _still_registered(self, db, email: str, uid: str) -> bool:
+        with tracing.firestore_span("get", "users"):
+            snapshot = db.collection("users").document(uid).get(field_paths=["email"])
+        return snapshot.exists and (snapshot.to_dict() or {}).get("email") == email
+
+    def lookup(self, db, email: str) -> Optional[str]:
+        """Uid currently registered with ``email``, or None."""
+        with self._lock:
+            uid = self._uids.get(email)
+        if uid is not None:
+            if self._still_registered(db, email, uid):
+                return uid
+            # The user has changed email since it was indexed
+            self.forget(email)
+
+        # Users registered after the index was loaded
+        with tracing.firestore_span("query", "users"):
+            docs = list(
+                db.collection("users").where("email", "==", email).limit(1).stream()
+            )
+        if not docs:
+            return None
+        uid = docs[0].to_dict().get("uid") or docs[0].id
+        self.remember(email, uid)
+        return uid
+
+
+email_index = EmailIndex()
@@ -0,0 +1,120 @@
+"""Family members with their profiles and learning progress, cached per user."""
+
+import logging
+from typing import Any, Dict, Iterable, List, Sequence
+
+from app.core import tracing
+from app.core.cache import FAMILY, response_cache
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Firestore accepts at most 30 values in an "in" filter
+MAX_IN_VALUES = 30
+
+# Profile fields shared with family members; the rest of the document
+# holds token claims that stay private
+PROFILE_FIELDS = ["name", "email", "picture"]
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _progress_by_user(db, uids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """Enrollment summary of each user, 30 users per query."""
+    totals = {uid: {"enrolled": 0, "completed": 0, "progressSum": 0} for uid in uids}
+    last_accessed = {}
+    with tracing.firestore_span("query", "enrollments") as span:
+        count = 0
+        for chunk in _chunks(list(uids), MAX_IN_VALUES):
+            query = (
+                db.collection("enrollments")
+                .where("userId", "in", list(chunk))
+                .select(["userId", "progress", "completed", "lastAccessed"])
+            )
+            for doc in query.stream():
+                count += 1
+                enrollment_data = doc.to_dict()
+                uid = enrollment_data.get("userId")
+                user_totals = totals[uid]
+                user_totals["enrolled"] += 1
+                user_totals["completed"] += 1 if enrollment_data.get("completed") else 0
+                user_totals["progressSum"] += enrollment_data.get("progress", 0) or 0
+                accessed = enrollment_data.get("lastAccessed")
+                if accessed is not None and (
+                    uid not in last_accessed or accessed > last_accessed[uid]
+                ):
+                    last_accessed[uid] = accessed
+        span.set_attribute("firestore.doc_count", count)
+
+    return {
+        uid: {
+            "enrolled": user_totals["enrolled"],
+            "completed": user_totals["completed"],
+            "averageProgress": (
+                round(user_totals["progressSum"] / user_totals["enrolled"], 2)
+                if user_totals["enrolled"]
+                else 0
+            ),
+            "lastAccessed": last_accessed.get(uid),
+        }
+        for uid, user_totals in totals.items()
+    }
+
+
+def load_family(db, uid: str) -> List[Dict[str, Any]]:
+    """
+    Read the family of ``uid`` with each member's profile and enrollment
+    summary, and cache the result.
+
+    Costs one read of the family document, one multi-get of the members'
+    profiles and one enrollments query per 30 members, however many
+    members and enrollments there are.
+    """
+    with tracing.firestore_span("get", "family"):
+        family_doc = db.collection("family").document(uid).get()
+    members = family_doc.to_dict().get("members", []) if family_doc.exists else []
+
+    # Stored emails by uid; a member can appear twice with different emails,
+    # and entries written before members carried a uid are skipped
+    stored_emails = {
+        member["uid"]: member.get("email") for member in members if member.get("uid")
+    }
+    member_uids = list(stored_emails)
+    profiles = {}
+    progress = {}
+    if member_uids:
+        refs = [
+            db.collection("users").document(member_uid) for member_uid in member_uids
+        ]
+        with tracing.firestore_span("get_all", "users", doc_count=len(refs)):
+            for snapshot in db.get_all(refs, field_paths=PROFILE_FIELDS):
+                if snapshot.exists:
+                    profiles[snapshot.id] = snapshot.to_dict()
+        progress = _progress_by_user(db, member_uids)
+
+    family = []
+    for member_uid in member_uids:
+        profile = profiles.get(member_uid, {})
+        family.append(
+            {
+                "uid": member_uid,
+                "email": profile.get("email", stored_emails[member_uid]),
+                "name": profile.get("name"),
+                "picture": profile.get("picture"),
+                "progress": progress[member_uid],
+            }
+        )
+
+    response_cache.set(FAMILY, uid, family)
+    return family
+
+
+def get_family(db, uid: str) -> List[Dict[str, Any]]:
+    """The enriched family of ``uid``, from the cache when it is warm."""
+    family = response_cache.get(FAMILY, uid)
+    if family is None:
+        family = load_family(db, uid)
+    return family
@@ -1,7 +1,19 @@
+"""Firebase Admin SDK initialization and client accessors.
+
+Nothing happens at import time: the SDK is initialized by ``init_firebase``,
+called from the application lifespan, or on first use of one of the
+accessors by scripts that run outside the app.
+"""
+
+import logging
 import os
+import threading
+
 import firebase_admin
-from firebase_admin import credentials, firestore, auth, storage
-import json
+from firebase_admin import credentials, firestore, storage
+
+# Set up logging
+logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 json_path = os.path.abspath(
@@ -12,35 +24,46 @@ json_path = os.path.abspath(
 STORAGE_BUCKET = "aiacademyhub.firebasestorage.app"
 FIRESTORE_DATABASE_ID = "ai-academy"
 
-try:
-    cred = credentials.Certificate(json_path)
-    firebase_app = firebase_admin.initialize_app(
-        cred,
-        {
-            "storageBucket": FIRESTORE_DATABASE_ID  # This sets the default bucket for storage operations
-        },
-    )
-except Exception as e:
-    print(f"Error initializing Firebase Admin SDK: {e}")
-    exit()
+_cred = None
+_db = None
+_init_lock = threading.Lock()
+
+
+def init_firebase():
+    """
+    Initialize the Firebase Admin SDK once and return the default app.
+    Raises if the service account file cannot be loaded.
+    """
+    global _cred
+    with _init_lock:
+        if _cred is None:
+            cred = credentials.Certificate(json_path)
+            if not firebase_admin._apps:
+                firebase_admin.initialize_app(
+                    cred,
+                    {
+                        "storageBucket": FIRESTORE_DATABASE_ID  # This sets the default bucket for storage operations
+                    },
+                )
+            _cred = cred
+            logger.info("Firebase Admin SDK initialized")
+    return firebase_admin.get_app()
 
 
 def get_firebase_app():
     # --- Initialize the Firebase Admin SDK ---
-    return cred
+    init_firebase()
+    return _cred
 
 
 def get_firestore_client():
-    try:
-        db = firestore.client(database_id=FIRESTORE_DATABASE_ID)
-    except Exception as e:
-        print(f"Error connecting to Firestore or performing operations: {e}")
-    return db
+    global _db
+    if _db is None:
+        init_firebase()
+        _db = firestore.client(database_id=FIRESTORE_DATABASE_ID)
+    return _db
 
 
 def get_storage_bucket():
-    try:
-        bucket = storage.bucket()
-    except Exception as e:
-        print(f"Error connecting to Storage or performing operations: {e}")
-    return bucket
+    init_firebase()
+    return storage.bucket()
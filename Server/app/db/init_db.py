@@ -21,37 +21,23 @@ def init_db():
             user.Base.metadata.create_all(bind=engine)
             logger.info("SQLite database tables initialized")
         except (ImportError, AttributeError, Exception) as e:
-            logger.warning(f"SQLite database initialization skipped: {e}")
+            logger.warning("SQLite database initialization skipped: %s", e)
 
         # Initialize Firestore collections
         try:
             from app.db.firestore import get_firestore_client
 
-            # Get Firestore client
-            db = get_firestore_client()
-
-            # Check required collections existence
-            required_collections = [
-                "users",
-                "courses",
-                "enrollments",
-                "family",
-                "invitations",
-            ]
-
-            existing_collections = [collection.id for collection in db.collections()]
-
-            # Log initialization status
-            logger.info(
-                f"Firestore initialized with collections: {existing_collections}"
-            )
+            # Get Firestore client; listing collections would cost a round
+            # trip on every boot, so only the client is created here
+            get_firestore_client()
+            logger.info("Firestore client initialized")
 
             # Note: Firestore collections are created automatically when documents are added
             # so we don't need to explicitly create them
         except Exception as e:
-            logger.warning(f"Firestore initialization skipped: {e}")
+            logger.warning("Firestore initialization skipped: %s", e)
 
         return True
     except Exception as e:
-        logger.error(f"Failed to initialize database: {e}", exc_info=True)
+        logger.error("Failed to initialize database: %s", e, exc_info=True)
         return False
@@ -0,0 +1,155 @@
+"""Family invitations: creation, expiry and compaction.
+
+Every invitation in ``invitations/{token}`` expires ``INVITATION_TTL_DAYS``
+after it is sent (``expiresAt``). A sender has at most one pending
+invitation per recipient: ``invitation_index/{sender}_{recipient}`` points
+at it and is claimed in the same transaction that creates the invitation.
+
+:func:`sweep_invitations` deletes expired and accepted invitations, with
+their index entries, in batched writes. The scheduler runs it every
+``INVITATION_SWEEP_SECONDS``.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from firebase_admin import firestore
+
+from app.core import tracing
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+INVITATION_TTL_DAYS = float(os.environ.get("INVITATION_TTL_DAYS", "7"))
+INVITATION_SWEEP_SECONDS = float(os.environ.get("INVITATION_SWEEP_SECONDS", "3600"))
+
+# Firestore rejects batches with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+
+class DuplicateInvitation(Exception):
+    """The sender already has a pending invitation for this recipient."""
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def index_ref(db, sender_uid: str, recipient_uid: str):
+    return db.collection("invitation_index").document(f"{sender_uid}_{recipient_uid}")
+
+
+def expires_at(invitation_data: Dict[str, Any]) -> Optional[datetime]:
+    """When the invitation expires; older invitations count from creation."""
+    expires = invitation_data.get("expiresAt")
+    if expires is None and invitation_data.get("created_at") is not None:
+        expires = invitation_data["created_at"] + timedelta(days=INVITATION_TTL_DAYS)
+    return expires
+
+
+def is_expired(invitation_data: Dict[str, Any]) -> bool:
+    expires = expires_at(invitation_data)
+    return expires is not None and expires <= datetime.now(timezone.utc)
+
+
+def create_invitation(
+    db, sender_uid: str, recipient_uid: str, recipient_email: str
+) -> str:
+    """
+    Create a pending invitation and return its token.
+    Raises DuplicateInvitation while an earlier one to the same recipient is
+    still pending.
+    """
+    token = os.urandom(16).hex()
+    invitation_ref = db.collection("invitations").document(token)
+    pair_ref = index_ref(db, sender_uid, recipient_uid)
+    expires = datetime.now(timezone.utc) + timedelta(days=INVITATION_TTL_DAYS)
+
+    @firestore.transactional
+    def claim(transaction):
+        pair_doc = pair_ref.get(transaction=transaction)
+        if pair_doc.exists and not is_expired(pair_doc.to_dict()):
+            raise DuplicateInvitation()
+        transaction.set(
+            invitation_ref,
+            {
+                "sender_uid": sender_uid,
+                "recipient_uid": recipient_uid,
+                "recipient_email": recipient_email,
+                "status": "pending",
+                "created_at": firestore.SERVER_TIMESTAMP,
+                "expiresAt": expires,
+            },
+        )
+        transaction.set(pair_ref, {"token": token, "expiresAt": expires})
+
+    with tracing.firestore_span("transaction", "invitations"):
+        claim(db.transaction())
+    return token
+
+
+def cancel_invitation(db, token: str, sender_uid: str, recipient_uid: str) -> None:
+    """Delete an invitation whose email was never sent, freeing the pair."""
+    try:
+        batch = db.batch()
+        batch.delete(db.collection("invitations").document(token))
+        batch.delete(index_ref(db, sender_uid, recipient_uid))
+        with tracing.firestore_span("batch", "invitations", doc_count=2):
+            batch.commit()
+    except Exception as e:
+        # The sweeper removes it once it expires
+        logger.warning("Could not cancel invitation %s: %s", token, e)
+
+
+def sweep_invitations(db) -> int:
+    """
+    Delete every expired or accepted invitation and its index entry.
+    Returns the number of invitations deleted.
+    """
+    now = datetime.now(timezone.utc)
+    invitations = db.collection("invitations")
+    queries = [
+        invitations.where("expiresAt", "<=", now),
+        invitations.where("status", "==", "accepted"),
+        # Invitations sent before expiresAt existed
+        invitations.where(
+            "created_at", "<=", now - timedelta(days=INVITATION_TTL_DAYS)
+        ),
+    ]
+    stale = {}
+    with tracing.firestore_span("query", "invitations") as span:
+        for query in queries:
+            for doc in query.select(["sender_uid", "recipient_uid"]).stream():
+                stale[doc.id] = doc.to_dict()
+        span.set_attribute("firestore.doc_count", len(stale))
+
+    deleted = 0
+    # Each invitation takes up to two deletes: itself and its index entry
+    for chunk in _chunks(list(stale.items()), MAX_BATCH_SIZE // 2):
+        tokens = {token for token, _ in chunk}
+        pair_refs = {}
+        for _, invitation_data in chunk:
+            ref = index_ref(
+                db,
+                invitation_data.get("sender_uid"),
+                invitation_data.get("recipient_uid"),
+            )
+            pair_refs[ref.path] = ref
+
+        batch = db.batch()
+        # The index may already point at a newer invitation for the pair
+        for snapshot in db.get_all(list(pair_refs.values()), field_paths=["token"]):
+            if snapshot.exists and snapshot.get("token") in tokens:
+                batch.delete(snapshot.reference)
+        for token in tokens:
+            batch.delete(invitations.document(token))
+        with tracing.firestore_span("batch", "invitations", doc_count=len(tokens)):
+            batch.commit()
+        deleted += len(tokens)
+
+    if deleted:
+        logger.info("Swept %s expired or accepted invitations", deleted)
+    return deleted
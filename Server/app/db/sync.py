@@ -0,0 +1,113 @@
+"""Delta sync of the course catalog and enrollments.
+
+A sync token is an opaque, URL-safe encoding of the server time at which a
+sync was served. The next sync returns only documents whose ``createdAt`` /
+``updatedAt`` (courses) or ``enrolledAt`` / ``lastAccessed`` (enrollments)
+are newer than the token, plus the ``tombstones`` written when a course is
+deleted. The token is backdated by ``SYNC_OVERLAP_SECONDS`` so writes that
+commit while a sync is being served are returned again rather than missed;
+clients merge by id, so repeats are harmless.
+"""
+
+import base64
+import binascii
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from firebase_admin import firestore
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TOMBSTONES_COLLECTION = "tombstones"
+SYNC_OVERLAP_SECONDS = 5
+
+
+def encode_token(moment: datetime) -> str:
+    """Encode a point in time as a sync token."""
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> datetime:
+    """Decode a sync token. Raises ``ValueError`` on a malformed token."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        moment = datetime.fromisoformat(base64.urlsafe_b64decode(padded).decode())
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed sync token: {e}")
+    if moment.tzinfo is None:
+        raise ValueError("Malformed sync token: missing timezone")
+    return moment
+
+
+def new_token() -> str:
+    """Token for a sync served now."""
+    now = datetime.now(timezone.utc) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    return encode_token(now)
+
+
+def write_course_tombstone(db, course_id: str) -> None:
+    """Record the deletion of a course for clients that sync later."""
+    db.collection(TOMBSTONES_COLLECTION).document(f"courses_{course_id}").set(
+        {
+            "collection": "courses",
+            "docId": course_id,
+            "deletedAt": firestore.SERVER_TIMESTAMP,
+        }
+    )
+
+
+def changed_courses(db, since: Optional[datetime]) -> List[Dict[str, Any]]:
+    """Courses created or updated after ``since`` (all courses when ``None``)."""
+    courses_ref = db.collection("courses")
+    if since is None:
+        docs = courses_ref.stream()
+    else:
+        # Two single-field queries, so no composite index is needed
+        docs = list(courses_ref.where("createdAt", ">", since).stream())
+        docs += list(courses_ref.where("updatedAt", ">", since).stream())
+
+    courses = {}
+    for doc in docs:
+        course_data = doc.to_dict()
+        course_data["id"] = doc.id
+        courses[doc.id] = course_data
+    return list(courses.values())
+
+
+def changed_enrollments(
+    db, uid: str, since: Optional[datetime]
+) -> List[Dict[str, Any]]:
+    """The user's enrollments created or touched after ``since``."""
+    # A user has few enrollments, so filter in memory rather than requiring
+    # a composite (userId, lastAccessed) index
+    enrollments = []
+    for doc in db.collection("enrollments").where("userId", "==", uid).stream():
+        enrollment_data = doc.to_dict()
+        changed_at = enrollment_data.get("lastAccessed") or enrollment_data.get(
+            "enrolledAt"
+        )
+        if since is not None and (changed_at is None or changed_at <= since):
+            continue
+        enrollments.append(
+            {
+                "enrollmentId": doc.id,
+                "courseId": enrollment_data.get("courseId"),
+                "progress": enrollment_data.get("progress", 0),
+                "completed": enrollment_data.get("completed", False),
+                "enrolledAt": enrollment_data.get("enrolledAt"),
+                "lastAccessed": enrollment_data.get("lastAccessed"),
+            }
+        )
+    return enrollments
+
+
+def deleted_course_ids(db, since: datetime) -> List[str]:
+    """Ids of courses deleted after ``since``."""
+    tombstones = (
+        db.collection(TOMBSTONES_COLLECTION).where("deletedAt", ">", since).stream()
+    )
+    return [
+        doc.get("docId") for doc in tombstones if doc.get("collection") == "courses"
+    ]
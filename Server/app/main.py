@@ -1,40 +1,111 @@
 """Main module for the FastAPI application."""
 
 import os
+from contextlib import asynccontextmanager
 
-import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, PlainTextResponse
 
-# Try importing Jinja2Templates but provide a fallback
-try:
-    from fastapi.templating import Jinja2Templates
-
-    jinja2_available = True
-except (ImportError, AssertionError):
-    import sys
-
-    print(
-        "WARNING: jinja2 is not installed. HTML templating will not be available.",
-        file=sys.stderr,
-    )
-    print("Install it using: pip install jinja2", file=sys.stderr)
-    jinja2_available = False
+from app.core.logging_config import (
+    RequestContextMiddleware,
+    configure_logging,
+    stop_logging,
+)
 
 # Import database initialization
 from app.db import init_db
 
+from app.core import metrics
+from app.core.admission import AdmissionMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.idempotency import IdempotencyMiddleware
+from app.core import profiling, tracing
+from app.core.responses import FirestoreJSONResponse
+from app.core.scheduler import scheduler
+from app.core.static import PrecompressedStaticFiles, SPAShell
+from app.core.warmup import warm_token_keys, warmup
+from app.db import catalog, counters, invitations
+from app.db.email_index import email_index
+from app.db.firestore import get_firestore_client, init_firebase
+
 # Import route modules
-from app.routes import api, settings
+from app.routes import admin, api, batch, events, settings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Initialize Firebase, precompress static files, warm up caches and start
+    the scheduled jobs on startup; drain the jobs, withdraw this worker's
+    metrics and flush queued log records on shutdown. Importing this module
+    has no side effects.
+    """
+    # Route all logging through the background queue before anything logs
+    configure_logging()
+    init_firebase()
+    init_db.init_db()
+    static_files.precompress()
+    asset_files.precompress()
+    spa_shell.load()
+    metrics.start_snapshot_writer()
+    tracing.configure_tracing()
+
+    # /ready turns 200 once these finish or WARMUP_DEADLINE passes
+    db = get_firestore_client()
+    warmup.start(
+        {
+            "catalog": lambda: catalog.load_catalog(db),
+            "token_keys": warm_token_keys,
+            "email_index": lambda: email_index.load(db),
+        }
+    )
+    profiling.start_continuous_profiling()
+
+    # Periodic jobs; leader-only ones run in one worker per host
+    scheduler.add_interval(
+        "catalog-refresh",
+        lambda: catalog.load_catalog(db),
+        catalog.CATALOG_REFRESH_SECONDS,
+        jitter=5,
+    )
+    scheduler.add_interval(
+        "trace-flush", tracing.flush_tracing, tracing.TRACE_FLUSH_SECONDS
+    )
+    scheduler.add_cron(
+        "course-stats-reconcile",
+        lambda: counters.reconcile_course_stats(db),
+        counters.COURSE_STATS_RECONCILE_CRON,
+        jitter=60,
+        leader_only=True,
+    )
+    scheduler.add_interval(
+        "invitation-sweep",
+        lambda: invitations.sweep_invitations(db),
+        invitations.INVITATION_SWEEP_SECONDS,
+        jitter=60,
+        leader_only=True,
+    )
+    scheduler.start()
+
+    yield
+
+    # Let running jobs finish before the services they use shut down
+    await scheduler.stop()
+    metrics.stop_snapshot_writer()
+    profiling.stop_continuous_profiling()
+    tracing.shutdown_tracing()
+    stop_logging()
+
 
 app = FastAPI(
     title="AI Academy",
     version="0.0.1",
     description="API Documentation for AI Academy",
+    default_response_class=FirestoreJSONResponse,
+    lifespan=lifespan,
 )
 
 # Middleware
@@ -43,6 +114,10 @@ allowed_origins = os.environ.get(
     "CORS_ORIGINS", "http://localhost:5173,http://localhost:3000"
 ).split(",")
 
+# Replays responses of retried POSTs that carry an Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+# Shed responses still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -50,6 +125,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress API responses; tuned through COMPRESSION_* environment variables
+app.add_middleware(CompressionMiddleware)
+# Latency, status and wire size per route, exposed on /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+# Admin-only per-request sampling profiles (X-Profile: 1)
+app.add_middleware(profiling.ProfilingMiddleware)
+# Root span per request; exporter chosen by TRACE_EXPORTER
+app.add_middleware(tracing.TracingMiddleware)
+# Outermost: request id and route for every log record
+app.add_middleware(RequestContextMiddleware)
 
 
 @app.get("/status", tags=["health"])
@@ -58,48 +143,66 @@ def check_health():
     return {"status": "ok"}
 
 
+@app.get("/ready", tags=["health"])
+def check_ready():
+    """Report whether startup warm-up has finished, for load balancers."""
+    if not warmup.ready:
+        return JSONResponse(
+            {"status": "warming_up", "warmup": warmup.results}, status_code=503
+        )
+    return {"status": "ready", "warmup": warmup.results}
+
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+def read_metrics():
+    """Expose request metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.collect(), media_type=metrics.CONTENT_TYPE)
+
+
 # Serving - static files
 static_files_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+static_files = PrecompressedStaticFiles(directory=static_files_path)
+asset_files = PrecompressedStaticFiles(
+    directory=os.path.join(static_files_path, "assets")
+)
 # Mount for backward compatibility
-app.mount("/static", StaticFiles(directory=static_files_path), name="static")
+app.mount("/static", static_files, name="static")
 # Mount for new client app with base='/'
-app.mount(
-    "/assets",
-    StaticFiles(directory=os.path.join(static_files_path, "assets")),
-    name="assets",
+app.mount("/assets", asset_files, name="assets")
+# The SPA shell is served from memory; reload it on change in development
+spa_shell = SPAShell(
+    os.path.join(static_files_path, "index.html"),
+    watch=os.environ.get("APP_ENV", "production") == "development",
 )
-# Initialize templates only if jinja2 is available
-if jinja2_available:
-    templates = Jinja2Templates(directory=static_files_path)
-else:
-    templates = None
 
 
 @app.get("/", response_class=HTMLResponse)
 @app.get("/index.html", response_class=HTMLResponse)
 def read_index(request: Request):
     """Serve the index.html file of front-end code at the root."""
-    if templates is None:
-        # If Jinja2 is not available, return a simple HTML response
-        return HTMLResponse(
-            "<html><body><h1>Error: Jinja2 not installed</h1><p>Please install jinja2: <pre>pip install jinja2</pre></p></body></html>"
-        )
-
-    return templates.TemplateResponse("index.html", {"request": request})
+    return spa_shell.response(request)
 
 
 # API routes
 app.include_router(api.router, prefix="/api", tags=["api"])
 app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(events.router, prefix="/api", tags=["events"])
+app.include_router(batch.router, prefix="/api", tags=["batch"])
 
 
-@app.on_event("startup")
-def startup_event():
-    """Initialize database on startup."""
-    init_db.init_db()
+@app.get("/{full_path:path}", response_class=HTMLResponse, include_in_schema=False)
+def read_client_route(full_path: str, request: Request):
+    """Serve the SPA shell for client-side routes such as /dashboard."""
+    # Unknown API paths and missing files should still be 404s
+    if full_path.startswith("api/") or "." in full_path.rsplit("/", 1)[-1]:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return spa_shell.response(request)
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(
         "app.main:app",
@@ -1,3 +1 @@
 """Routes package initialization."""
-
-from . import auth, users
@@ -0,0 +1,240 @@
+"""Admin-only maintenance routes for the AI Academy application."""
+
+import logging
+import os
+from typing import Optional
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.core import jobs, profiling
+from app.core.scheduler import scheduler
+from app.core.request_body import json_body
+from app.core.security import get_admin_user
+from app.db import bulk, catalog, cohort, counters
+from app.db.firestore import get_firestore_client
+from app.schemas.course import CohortEnrollment
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Create router
+router = APIRouter()
+
+
+@router.post("/course-stats/reconcile")
+async def reconcile_course_stats(current_user=Depends(get_admin_user)):
+    """
+    Recomputes the sharded enrollment counters of every course in bulk
+    and materializes them on the course documents.
+    Admin privileges required.
+    """
+    try:
+        db = get_firestore_client()
+        # Streams every enrollment; keep the event loop free meanwhile
+        reconciled = await run_in_threadpool(counters.reconcile_course_stats, db)
+        catalog.invalidate_catalog()
+
+        logger.info(
+            "Course stats reconciled for %s courses by %s",
+            reconciled,
+            current_user.get("uid"),
+        )
+        return {"message": f"Reconciled stats for {reconciled} courses"}
+
+    except Exception as e:
+        logger.error("Failed to reconcile course stats: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to reconcile course stats: {e}",
+        )
+
+
+@router.post("/cohort-enrollments")
+async def enroll_cohort(
+    background_tasks: BackgroundTasks,
+    cohort_request: CohortEnrollment = Depends(json_body(CohortEnrollment)),
+    current_user=Depends(get_admin_user),
+):
+    """
+    Enrolls a cohort of learners, given by uid and/or email, in one or more
+    courses. Runs as a background job whose progress can be polled at
+    /api/jobs/{job_id}.
+    Admin privileges required.
+    """
+    if not cohort_request.uids and not cohort_request.emails:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide at least one uid or email.",
+        )
+
+    try:
+        db = get_firestore_client()
+
+        # Learners are resolved and enrolled after the response is sent
+        job = jobs.create_job(
+            "cohort_enrollment",
+            current_user.get("uid"),
+            learners=len(cohort_request.uids) + len(cohort_request.emails),
+            courseIds=cohort_request.courseIds,
+        )
+        background_tasks.add_task(
+            cohort.enroll_cohort,
+            db,
+            cohort_request.uids,
+            cohort_request.emails,
+            cohort_request.courseIds,
+            job,
+        )
+
+        logger.info(
+            "Cohort enrollment %s started by %s", job.id, current_user.get("uid")
+        )
+        return {"message": "Cohort enrollment started", "jobId": job.id}
+
+    except Exception as e:
+        logger.error("Failed to start cohort enrollment: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to start cohort enrollment: {e}",
+        )
+
+
+# ==================== BULK EXPORT / IMPORT ====================
+
+
+@router.get("/export")
+async def export_collections(
+    collections: str = Query(",".join(bulk.EXPORTABLE_COLLECTIONS)),
+    current_user=Depends(get_admin_user),
+):
+    """
+    Streams the requested collections as NDJSON, one document per line.
+    Admin privileges required.
+    """
+    names = [name.strip() for name in collections.split(",") if name.strip()]
+    invalid = [name for name in names if name not in bulk.EXPORTABLE_COLLECTIONS]
+    if invalid or not names:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Collections must be among: {', '.join(bulk.EXPORTABLE_COLLECTIONS)}",
+        )
+
+    db = get_firestore_client()
+    logger.info("Export of %s started by %s", names, current_user.get("uid"))
+
+    # The generator is synchronous, so Starlette iterates it in a threadpool
+    return StreamingResponse(
+        bulk.export_ndjson(db, names),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="export.ndjson"'},
+    )
+
+
+@router.post("/import")
+async def import_collections(
+    request: Request,
+    checkpoint: Optional[str] = Query(None),
+    current_user=Depends(get_admin_user),
+):
+    """
+    Imports an NDJSON body produced by the export endpoint.
+    The body is parsed while it streams in and written through parallel
+    batched writes. Pass ``checkpoint`` to resume an interrupted import.
+    Admin privileges required.
+    """
+    db = get_firestore_client()
+    checkpoint_path = None
+    if checkpoint:
+        # Keep checkpoints inside the working directory
+        checkpoint_path = f"import-{os.path.basename(checkpoint)}.checkpoint"
+
+    importer = None
+    try:
+        # Reads the checkpoint, which may be corrupt
+        importer = bulk.NDJSONImporter(db, checkpoint_path=checkpoint_path)
+        remainder = b""
+        async for chunk in request.stream():
+            lines = (remainder + chunk).split(b"\n")
+            remainder = lines.pop()
+            if lines:
+                await run_in_threadpool(importer.add_lines, lines)
+        if remainder:
+            await run_in_threadpool(importer.add_line, remainder)
+        imported = await run_in_threadpool(importer.close)
+    except ValueError as e:
+        # Commit the lines before the bad one so the import can resume
+        if importer is not None:
+            await run_in_threadpool(importer.close)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error("Failed to import collections: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import collections: {e}",
+        )
+    finally:
+        if importer is not None:
+            await run_in_threadpool(importer.abort)
+
+    logger.info("Imported %s documents by %s", imported, current_user.get("uid"))
+    return {"message": f"Imported {imported} documents", "lines": importer.lines_seen}
+
+
+# ==================== PROFILES ====================
+
+
+@router.get("/profiles")
+async def list_profiles(current_user=Depends(get_admin_user)):
+    """
+    Lists the sampling profiles written by flagged requests and by the
+    continuous profiler, newest first.
+    Admin privileges required.
+    """
+    if not os.path.isdir(profiling.PROFILE_DIR):
+        return []
+    names = [
+        name for name in os.listdir(profiling.PROFILE_DIR) if name.endswith(".folded")
+    ]
+    names.sort(
+        key=lambda name: os.path.getmtime(os.path.join(profiling.PROFILE_DIR, name)),
+        reverse=True,
+    )
+    return names
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str, current_user=Depends(get_admin_user)):
+    """
+    Downloads one profile in the collapsed-stack format, ready for
+    flamegraph.pl or speedscope.
+    Admin privileges required.
+    """
+    path = os.path.join(profiling.PROFILE_DIR, os.path.basename(name))
+    if not name.endswith(".folded") or not os.path.isfile(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    return FileResponse(path, media_type="text/plain", filename=os.path.basename(name))
+
+
+# ==================== SCHEDULED JOBS ====================
+
+
+@router.get("/scheduled-jobs")
+async def list_scheduled_jobs(current_user=Depends(get_admin_user)):
+    """
+    Lists the periodic background jobs of this worker with their schedule,
+    next run and the outcome of their last run.
+    Admin privileges required.
+    """
+    return {"leader": scheduler.lock.held, "jobs": scheduler.status()}
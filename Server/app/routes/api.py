@@ -1,9 +1,31 @@
 """API routes for the AI Academy application."""
 
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    status,
+)
+from google.api_core.exceptions import AlreadyExists
 from app.db.firestore import get_firestore_client
-from app.core.security import get_current_user
+from app.db import cascade, catalog, counters, sync
+from app.core import jobs, tracing
+from app.core.cache import ENROLLMENTS, response_cache
+from app.core.events import broker
+from app.core.rate_limit import rate_limit
+from app.core.security import get_current_user, verify_admin
+from app.core.request_body import json_body
+from app.schemas.course import (
+    Course,
+    CourseCreate,
+    CourseUpdate,
+    Enrollment,
+    ProgressUpdate,
+)
 from typing import Dict, List, Optional, Any
 
 # Set up logging
@@ -15,7 +37,7 @@ router = APIRouter()
 # ==================== COURSES API ====================
 
 
-@router.get("/courses")
+@router.get("/courses", response_model=List[Course])
 async def get_all_courses(current_user=Depends(get_current_user)):
     """
     Retrieves all courses from Firestore.
@@ -32,31 +54,23 @@ async def get_all_courses(current_user=Depends(get_current_user)):
         # Get Firestore client
         db = get_firestore_client()
 
-        # Get all courses from Firestore
-        courses_ref = db.collection("courses")
-        courses_docs = courses_ref.stream()
+        # Get all courses, from the shared catalog cache when warm
+        courses = catalog.get_catalog(db)
 
-        # Convert to list of dictionaries
-        courses = []
-        for doc in courses_docs:
-            course_data = doc.to_dict()
-            course_data["id"] = doc.id  # Add document ID as 'id' field
-            courses.append(course_data)
-
-        logger.info(f"Retrieved {len(courses)} courses for user {uid}")
+        logger.info("Retrieved %s courses for user %s", len(courses), uid)
         return courses
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to retrieve courses: {e}", exc_info=True)
+        logger.error("Failed to retrieve courses: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to retrieve courses: {e}",
         )
 
 
-@router.get("/courses/{course_id}")
+@router.get("/courses/{course_id}", response_model=Course)
 async def get_course(course_id: str, current_user=Depends(get_current_user)):
     """
     Retrieves a specific course by ID from Firestore.
@@ -74,7 +88,8 @@ async def get_course(course_id: str, current_user=Depends(get_current_user)):
         db = get_firestore_client()
 
         # Get the course from Firestore
-        course_doc = db.collection("courses").document(course_id).get()
+        with tracing.firestore_span("get", "courses"):
+            course_doc = db.collection("courses").document(course_id).get()
 
         # Check if course exists
         if not course_doc.exists:
@@ -87,21 +102,28 @@ async def get_course(course_id: str, current_user=Depends(get_current_user)):
         course_data = course_doc.to_dict()
         course_data["id"] = course_doc.id
 
-        logger.info(f"Retrieved course {course_id} for user {uid}")
+        # Live stats from the counter shards
+        with tracing.firestore_span("query", counters.SHARDS_COLLECTION):
+            course_data["stats"] = counters.get_course_stats(db, course_id)
+
+        logger.info("Retrieved course %s for user %s", course_id, uid)
         return course_data
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to retrieve course {course_id}: {e}", exc_info=True)
+        logger.error("Failed to retrieve course %s: %s", course_id, e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to retrieve course: {e}",
         )
 
 
-@router.post("/courses")
-async def create_course(request: Request, current_user=Depends(get_current_user)):
+@router.post("/courses", dependencies=[Depends(rate_limit("courses-write"))])
+async def create_course(
+    course: CourseCreate = Depends(json_body(CourseCreate)),
+    current_user=Depends(get_current_user),
+):
     """
     Creates a new course in Firestore.
     Authentication required.
@@ -115,17 +137,8 @@ async def create_course(request: Request, current_user=Depends(get_current_user)
                 detail="User ID not found in token.",
             )
 
-        # Get request body
-        course_data = await request.json()
-
-        # Validate required fields
-        required_fields = ["title", "description", "author", "duration"]
-        for field in required_fields:
-            if field not in course_data:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Missing required field: {field}",
-                )
+        # Required fields are validated while parsing the body
+        course_data = course.model_dump(exclude_unset=True)
 
         # Add metadata
         course_data["createdBy"] = uid
@@ -136,28 +149,33 @@ async def create_course(request: Request, current_user=Depends(get_current_user)
 
         # Create the course in Firestore
         new_course_ref = db.collection("courses").document()
-        new_course_ref.set(course_data)
+        with tracing.firestore_span("set", "courses"):
+            new_course_ref.set(course_data)
+
+        catalog.invalidate_catalog()
 
         # Return the created course with its ID
         created_course = course_data
         created_course["id"] = new_course_ref.id
 
-        logger.info(f"Created course {new_course_ref.id} by user {uid}")
+        logger.info("Created course %s by user %s", new_course_ref.id, uid)
         return created_course
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to create course: {e}", exc_info=True)
+        logger.error("Failed to create course: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create course: {e}",
         )
 
 
-@router.put("/courses/{course_id}")
+@router.put("/courses/{course_id}", dependencies=[Depends(rate_limit("courses-write"))])
 async def update_course(
-    course_id: str, request: Request, current_user=Depends(get_current_user)
+    course_id: str,
+    course: CourseUpdate = Depends(json_body(CourseUpdate)),
+    current_user=Depends(get_current_user),
 ):
     """
     Updates an existing course in Firestore.
@@ -172,15 +190,16 @@ async def update_course(
                 detail="User ID not found in token.",
             )
 
-        # Get request body
-        course_data = await request.json()
+        # Only the fields sent by the client are updated
+        course_data = course.model_dump(exclude_unset=True)
 
         # Get Firestore client
         db = get_firestore_client()
 
         # Check if course exists
         course_ref = db.collection("courses").document(course_id)
-        course_doc = course_ref.get()
+        with tracing.firestore_span("get", "courses"):
+            course_doc = course_ref.get()
         if not course_doc.exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -200,26 +219,38 @@ async def update_course(
         course_data["updatedAt"] = firestore.SERVER_TIMESTAMP
 
         # Update the course
-        course_ref.update(course_data)
+        with tracing.firestore_span("update", "courses"):
+            course_ref.update(course_data)
 
         # Return success
-        logger.info(f"Updated course {course_id} by user {uid}")
+        # Enrollment listings embed the course
+        catalog.invalidate_catalog()
+        response_cache.clear(ENROLLMENTS)
+
+        logger.info("Updated course %s by user %s", course_id, uid)
         return {"message": f"Course {course_id} updated successfully"}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to update course {course_id}: {e}", exc_info=True)
+        logger.error("Failed to update course %s: %s", course_id, e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update course: {e}",
         )
 
 
-@router.delete("/courses/{course_id}")
-async def delete_course(course_id: str, current_user=Depends(get_current_user)):
+@router.delete(
+    "/courses/{course_id}", dependencies=[Depends(rate_limit("courses-write"))]
+)
+async def delete_course(
+    course_id: str,
+    background_tasks: BackgroundTasks,
+    current_user=Depends(get_current_user),
+):
     """
     Deletes a course from Firestore.
+    Its enrollments are removed by a background job whose id is returned.
     Authentication required.
     Admin role or creator check should be added.
     """
@@ -236,7 +267,8 @@ async def delete_course(course_id: str, current_user=Depends(get_current_user)):
 
         # Check if course exists
         course_ref = db.collection("courses").document(course_id)
-        course_doc = course_ref.get()
+        with tracing.firestore_span("get", "courses"):
+            course_doc = course_ref.get()
         if not course_doc.exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -251,27 +283,59 @@ async def delete_course(course_id: str, current_user=Depends(get_current_user)):
         #         detail="You don't have permission to delete this course."
         #     )
 
-        # Delete the course
-        course_ref.delete()
+        # Delete the course and its counter shards
+        with tracing.firestore_span("delete", "courses"):
+            course_ref.delete()
+            counters.delete_course_counters(db, course_id)
+            sync.write_course_tombstone(db, course_id)
+
+        # Enrollments are cleaned up after the response is sent
+        job = jobs.create_job("delete_course_enrollments", uid, courseId=course_id)
+        background_tasks.add_task(cascade.delete_course_enrollments, db, course_id, job)
 
         # Return success
-        logger.info(f"Deleted course {course_id} by user {uid}")
-        return {"message": f"Course {course_id} deleted successfully"}
+        catalog.invalidate_catalog()
+        response_cache.clear(ENROLLMENTS)
+
+        logger.info("Deleted course %s by user %s", course_id, uid)
+        return {
+            "message": f"Course {course_id} deleted successfully",
+            "jobId": job.id,
+        }
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to delete course {course_id}: {e}", exc_info=True)
+        logger.error("Failed to delete course %s: %s", course_id, e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete course: {e}",
         )
 
 
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, current_user=Depends(get_current_user)):
+    """
+    Reports the progress of a background job started by the current user.
+    Authentication required.
+    """
+    job = jobs.get_job(job_id)
+    if job is None or (
+        job.owner_uid != current_user.get("uid") and not verify_admin(current_user)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found.",
+        )
+    return job.to_dict()
+
+
 # ==================== USER ENROLLMENT API ====================
 
 
-@router.post("/courses/{course_id}/enroll")
+@router.post(
+    "/courses/{course_id}/enroll", dependencies=[Depends(rate_limit("enroll"))]
+)
 async def enroll_in_course(course_id: str, current_user=Depends(get_current_user)):
     """
     Enrolls the current user in a course.
@@ -290,7 +354,8 @@ async def enroll_in_course(course_id: str, current_user=Depends(get_current_user
 
         # Check if course exists
         course_ref = db.collection("courses").document(course_id)
-        course_doc = course_ref.get()
+        with tracing.firestore_span("get", "courses"):
+            course_doc = course_ref.get()
         if not course_doc.exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -299,7 +364,9 @@ async def enroll_in_course(course_id: str, current_user=Depends(get_current_user
 
         # Check if user is already enrolled
         enrollment_ref = db.collection("enrollments").document(f"{uid}_{course_id}")
-        if enrollment_ref.get().exists:
+        with tracing.firestore_span("get", "enrollments"):
+            already_enrolled = enrollment_ref.get().exists
+        if already_enrolled:
             return {"message": "Already enrolled in this course"}
 
         # Create enrollment document
@@ -312,23 +379,38 @@ async def enroll_in_course(course_id: str, current_user=Depends(get_current_user
             "lastAccessed": firestore.SERVER_TIMESTAMP,
         }
 
-        enrollment_ref.set(enrollment_data)
+        # Write the enrollment and bump the course counters atomically; create
+        # fails if a concurrent or retried request enrolled first, and the
+        # increment is dropped with it
+        try:
+            with tracing.firestore_span("batch", "enrollments", doc_count=2):
+                batch = db.batch()
+                batch.create(enrollment_ref, enrollment_data)
+                counters.add_increment(batch, db, course_id, enrolled=1)
+                batch.commit()
+        except AlreadyExists:
+            return {"message": "Already enrolled in this course"}
+
+        response_cache.invalidate(ENROLLMENTS, uid)
+
+        # Notify live subscribers
+        broker.publish(uid, "enrollment", {"courseId": course_id, "progress": 0})
 
         # Return success
-        logger.info(f"User {uid} enrolled in course {course_id}")
+        logger.info("User %s enrolled in course %s", uid, course_id)
         return {"message": f"Successfully enrolled in course {course_id}"}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to enroll in course {course_id}: {e}", exc_info=True)
+        logger.error("Failed to enroll in course %s: %s", course_id, e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to enroll in course: {e}",
         )
 
 
-@router.get("/enrollments")
+@router.get("/enrollments", response_model=List[Enrollment])
 async def get_user_enrollments(current_user=Depends(get_current_user)):
     """
     Gets all courses the user is enrolled in.
@@ -342,12 +424,19 @@ async def get_user_enrollments(current_user=Depends(get_current_user)):
                 detail="User ID not found in token.",
             )
 
+        # Repeat dashboard loads are served from the per-user cache
+        cached = response_cache.get(ENROLLMENTS, uid)
+        if cached is not None:
+            return cached
+
         # Get Firestore client
         db = get_firestore_client()
 
         # Query enrollments for the user
-        enrollments_query = db.collection("enrollments").where("userId", "==", uid)
-        enrollment_docs = enrollments_query.stream()
+        with tracing.firestore_span("query", "enrollments") as span:
+            enrollments_query = db.collection("enrollments").where("userId", "==", uid)
+            enrollment_docs = list(enrollments_query.stream())
+            span.set_attribute("firestore.doc_count", len(enrollment_docs))
 
         # Get course details for each enrollment
         result = []
@@ -356,7 +445,8 @@ async def get_user_enrollments(current_user=Depends(get_current_user)):
             course_id = enrollment_data.get("courseId")
 
             # Get course details
-            course_doc = db.collection("courses").document(course_id).get()
+            with tracing.firestore_span("get", "courses"):
+                course_doc = db.collection("courses").document(course_id).get()
             if course_doc.exists:
                 course_data = course_doc.to_dict()
                 course_data["id"] = course_doc.id
@@ -372,22 +462,27 @@ async def get_user_enrollments(current_user=Depends(get_current_user)):
                 }
                 result.append(enrollment_with_course)
 
-        logger.info(f"Retrieved {len(result)} enrollments for user {uid}")
+        response_cache.set(ENROLLMENTS, uid, result)
+        logger.info("Retrieved %s enrollments for user %s", len(result), uid)
         return result
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to retrieve enrollments: {e}", exc_info=True)
+        logger.error("Failed to retrieve enrollments: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to retrieve enrollments: {e}",
         )
 
 
-@router.put("/courses/{course_id}/progress")
+@router.put(
+    "/courses/{course_id}/progress", dependencies=[Depends(rate_limit("progress"))]
+)
 async def update_course_progress(
-    course_id: str, request: Request, current_user=Depends(get_current_user)
+    course_id: str,
+    progress_update: ProgressUpdate = Depends(json_body(ProgressUpdate)),
+    current_user=Depends(get_current_user),
 ):
     """
     Updates the user's progress in a course.
@@ -401,22 +496,9 @@ async def update_course_progress(
                 detail="User ID not found in token.",
             )
 
-        # Get request body
-        progress_data = await request.json()
-        progress = progress_data.get("progress")
-        completed = progress_data.get("completed", False)
-
-        # Validate progress
-        if (
-            progress is None
-            or not isinstance(progress, (int, float))
-            or progress < 0
-            or progress > 100
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Progress must be a number between 0 and 100.",
-            )
+        # Progress is validated (0 to 100) while parsing the body
+        progress = progress_update.progress
+        completed = progress_update.completed
 
         # Get Firestore client
         db = get_firestore_client()
@@ -424,24 +506,50 @@ async def update_course_progress(
         # Check if enrollment exists
         enrollment_id = f"{uid}_{course_id}"
         enrollment_ref = db.collection("enrollments").document(enrollment_id)
-        if not enrollment_ref.get().exists:
+        with tracing.firestore_span("get", "enrollments"):
+            enrollment_doc = enrollment_ref.get()
+        if not enrollment_doc.exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"You are not enrolled in course {course_id}.",
             )
 
-        # Update enrollment progress
-        enrollment_ref.update(
-            {
-                "progress": progress,
-                "completed": completed,
-                "lastAccessed": firestore.SERVER_TIMESTAMP,
-            }
+        # Work out the counter deltas from the previous state
+        previous = enrollment_doc.to_dict()
+        progress_delta = progress - (previous.get("progress", 0) or 0)
+        completed_delta = int(bool(completed)) - int(bool(previous.get("completed")))
+
+        # Update enrollment progress and the course counters atomically
+        with tracing.firestore_span("batch", "enrollments", doc_count=2):
+            batch = db.batch()
+            batch.update(
+                enrollment_ref,
+                {
+                    "progress": progress,
+                    "completed": completed,
+                    "lastAccessed": firestore.SERVER_TIMESTAMP,
+                },
+            )
+            counters.add_increment(
+                batch, db, course_id, completed=completed_delta, progress=progress_delta
+            )
+            batch.commit()
+
+        response_cache.invalidate(ENROLLMENTS, uid)
+
+        # Notify live subscribers
+        broker.publish(
+            uid,
+            "progress",
+            {"courseId": course_id, "progress": progress, "completed": completed},
         )
 
         # Return success
         logger.info(
-            f"Updated progress for user {uid} in course {course_id} to {progress}%"
+            "Updated progress for user %s in course %s to %s%%",
+            uid,
+            course_id,
+            progress,
         )
         return {"message": f"Progress updated to {progress}%"}
 
@@ -449,7 +557,7 @@ async def update_course_progress(
         raise
     except Exception as e:
         logger.error(
-            f"Failed to update progress in course {course_id}: {e}", exc_info=True
+            "Failed to update progress in course %s: %s", course_id, e, exc_info=True
         )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -457,5 +565,81 @@ async def update_course_progress(
         )
 
 
+# ==================== DELTA SYNC API ====================
+
+
+@router.get("/sync", dependencies=[Depends(rate_limit("sync"))])
+async def sync_changes(
+    since: Optional[str] = Query(None), current_user=Depends(get_current_user)
+):
+    """
+    Returns the courses and enrollments changed or deleted since the
+    client's last sync token, plus a new token for the next call.
+    Without a token the full catalog and enrollment list are returned.
+    Authentication required.
+    """
+    try:
+        uid = current_user.get("uid")
+        if not uid:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User ID not found in token.",
+            )
+
+        try:
+            since_time = sync.decode_token(since) if since else None
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        # Issue the next token before reading so nothing falls in between
+        next_token = sync.new_token()
+
+        # Get Firestore client
+        db = get_firestore_client()
+
+        with tracing.firestore_span("query", "courses") as span:
+            courses = sync.changed_courses(db, since_time)
+            span.set_attribute("firestore.doc_count", len(courses))
+        for course_data in courses:
+            course_data.setdefault("stats", counters.empty_stats())
+        with tracing.firestore_span("query", "enrollments") as span:
+            enrollments = sync.changed_enrollments(db, uid, since_time)
+            span.set_attribute("firestore.doc_count", len(enrollments))
+
+        # Enrollments of a deleted course are removed along with it
+        deleted_courses = []
+        if since_time is not None:
+            with tracing.firestore_span("query", sync.TOMBSTONES_COLLECTION):
+                deleted_courses = sync.deleted_course_ids(db, since_time)
+        deleted_enrollments = [f"{uid}_{course_id}" for course_id in deleted_courses]
+
+        logger.info(
+            "Synced %s courses and %s enrollments for user %s (full=%s)",
+            len(courses),
+            len(enrollments),
+            uid,
+            since_time is None,
+        )
+        return {
+            "token": next_token,
+            "full": since_time is None,
+            "courses": courses,
+            "enrollments": enrollments,
+            "deleted": {
+                "courses": deleted_courses,
+                "enrollments": deleted_enrollments,
+            },
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Failed to sync changes: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to sync changes: {e}",
+        )
+
+
 # Import missing dependency
 from firebase_admin import firestore
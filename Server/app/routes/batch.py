@@ -0,0 +1,289 @@
+"""Batch API running several course operations in one HTTP request."""
+
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+
+from app.core import rate_limit as rate_limits
+from app.core import tracing
+from app.core.cache import ENROLLMENTS, response_cache
+from app.core.events import broker
+from app.core.rate_limit import rate_limit
+from app.core.request_body import json_body
+from app.core.security import get_current_user
+from app.db import counters
+from app.db.firestore import get_firestore_client
+from app.schemas.batch import BatchOperation, BatchRequest, BatchResponse, BatchResult
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Create router
+router = APIRouter()
+
+WRITE_OPERATIONS = {"enroll", "update_progress"}
+# Rate-limit rule of the single-operation route each write stands for
+OPERATION_RULES = {"enroll": "enroll", "update_progress": "progress"}
+
+
+def _fetch_documents(db, refs) -> Dict[str, Any]:
+    """Read every document in one multi-get, keyed by document path."""
+    with tracing.firestore_span("get_all", "courses,enrollments", doc_count=len(refs)):
+        return {snapshot.reference.path: snapshot for snapshot in db.get_all(refs)}
+
+
+def _result(operation: BatchOperation, status_code: int, **fields) -> BatchResult:
+    return BatchResult(id=operation.id, op=operation.op, status=status_code, **fields)
+
+
+@router.post(
+    "/batch",
+    response_model=BatchResponse,
+    dependencies=[Depends(rate_limit("batch"))],
+)
+async def run_batch(
+    request: Request,
+    response: Response,
+    batch_request: BatchRequest = Depends(json_body(BatchRequest)),
+    current_user=Depends(get_current_user),
+):
+    """
+    Runs up to 50 course operations (get_course, enroll, update_progress)
+    with a single token verification. Every document involved is read in
+    one multi-get, course stats are read concurrently, and all writes are
+    committed in one Firestore batched write. Each operation gets its own
+    status in the response, in request order. Writes count against the
+    rate limits of the enroll and progress routes, one token each.
+    Authentication required.
+    """
+    try:
+        uid = current_user.get("uid")
+        if not uid:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User ID not found in token.",
+            )
+
+        operations = batch_request.operations
+
+        # Bill each write as if it had been sent to its own route
+        for op_name, rule_name in OPERATION_RULES.items():
+            count = sum(1 for op in operations if op.op == op_name)
+            if not count:
+                continue
+            capacity = rate_limits.RULES[rule_name].capacity
+            if count > capacity:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"A batch may hold at most {capacity} {op_name} operations.",
+                )
+            await run_in_threadpool(
+                rate_limits.charge, rule_name, uid, request, response, count
+            )
+
+        # Get Firestore client
+        db = get_firestore_client()
+
+        # One round trip for the courses and enrollments of every operation
+        course_refs = {
+            op.courseId: db.collection("courses").document(op.courseId)
+            for op in operations
+        }
+        enrollment_refs = {
+            op.courseId: db.collection("enrollments").document(f"{uid}_{op.courseId}")
+            for op in operations
+            if op.op in WRITE_OPERATIONS
+        }
+        snapshots = await run_in_threadpool(
+            _fetch_documents,
+            db,
+            list(course_refs.values()) + list(enrollment_refs.values()),
+        )
+
+        def course_exists(course_id: str) -> bool:
+            snapshot = snapshots.get(course_refs[course_id].path)
+            return snapshot is not None and snapshot.exists
+
+        # Reads: live stats of the requested courses, concurrently
+        read_ids = sorted(
+            {
+                op.courseId
+                for op in operations
+                if op.op == "get_course" and course_exists(op.courseId)
+            }
+        )
+        stats = await asyncio.gather(
+            *(
+                run_in_threadpool(counters.get_course_stats, db, course_id)
+                for course_id in read_ids
+            )
+        )
+        stats_by_course = dict(zip(read_ids, stats))
+
+        # Writes: validated against the snapshots and applied in request order
+        enrollments: Dict[str, Dict[str, Any]] = {}
+        for course_id, ref in enrollment_refs.items():
+            snapshot = snapshots.get(ref.path)
+            if snapshot is not None and snapshot.exists:
+                enrollments[course_id] = snapshot.to_dict()
+
+        write_batch = db.batch()
+        results: List[BatchResult] = []
+        written: List[int] = []
+        events = []
+        for operation in operations:
+            course_id = operation.courseId
+            if not course_exists(course_id):
+                results.append(
+                    _result(
+                        operation, 404, error=f"Course with ID {course_id} not found."
+                    )
+                )
+                continue
+
+            if operation.op == "get_course":
+                course_data = snapshots[course_refs[course_id].path].to_dict()
+                course_data["id"] = course_id
+                course_data["stats"] = stats_by_course[course_id]
+                results.append(_result(operation, 200, data=course_data))
+                continue
+
+            enrollment_ref = enrollment_refs[course_id]
+            if operation.op == "enroll":
+                if course_id in enrollments:
+                    results.append(
+                        _result(
+                            operation,
+                            200,
+                            data={"message": "Already enrolled in this course"},
+                        )
+                    )
+                    continue
+                enrollments[course_id] = {"progress": 0, "completed": False}
+                # create fails the batch if another request enrolled first
+                write_batch.create(
+                    enrollment_ref,
+                    {
+                        "userId": uid,
+                        "courseId": course_id,
+                        "enrolledAt": firestore.SERVER_TIMESTAMP,
+                        "progress": 0,
+                        "completed": False,
+                        "lastAccessed": firestore.SERVER_TIMESTAMP,
+                    },
+                )
+                counters.add_increment(write_batch, db, course_id, enrolled=1)
+                events.append(
+                    (uid, "enrollment", {"courseId": course_id, "progress": 0})
+                )
+                message = f"Successfully enrolled in course {course_id}"
+
+            else:
+                if operation.progress is None:
+                    results.append(
+                        _result(
+                            operation, 400, error="Missing required field: progress"
+                        )
+                    )
+                    continue
+                previous = enrollments.get(course_id)
+                if previous is None:
+                    results.append(
+                        _result(
+                            operation,
+                            404,
+                            error=f"You are not enrolled in course {course_id}.",
+                        )
+                    )
+                    continue
+                progress, completed = operation.progress, operation.completed
+                progress_delta = progress - (previous.get("progress", 0) or 0)
+                completed_delta = int(bool(completed)) - int(
+                    bool(previous.get("completed"))
+                )
+                enrollments[course_id] = {"progress": progress, "completed": completed}
+                write_batch.update(
+                    enrollment_ref,
+                    {
+                        "progress": progress,
+                        "completed": completed,
+                        "lastAccessed": firestore.SERVER_TIMESTAMP,
+                    },
+                )
+                counters.add_increment(
+                    write_batch,
+                    db,
+                    course_id,
+                    completed=completed_delta,
+                    progress=progress_delta,
+                )
+                events.append(
+                    (
+                        uid,
+                        "progress",
+                        {
+                            "courseId": course_id,
+                            "progress": progress,
+                            "completed": completed,
+                        },
+                    )
+                )
+                message = f"Progress updated to {progress}%"
+
+            written.append(len(results))
+            results.append(_result(operation, 200, data={"message": message}))
+
+        if written:
+            try:
+                with tracing.firestore_span(
+                    "batch", "enrollments", doc_count=len(written)
+                ):
+                    await run_in_threadpool(write_batch.commit)
+            except AlreadyExists:
+                # A concurrent request enrolled in one of the courses; nothing
+                # in the batch was written
+                for index in written:
+                    results[index] = _result(
+                        operations[index],
+                        409,
+                        error="An enrollment changed while the batch ran; retry.",
+                    )
+                events = []
+            except Exception as e:
+                # The batch is atomic, so every write failed together
+                logger.error(
+                    "Batch write failed for user %s: %s", uid, e, exc_info=True
+                )
+                for index in written:
+                    results[index] = _result(
+                        operations[index], 500, error=f"Failed to write: {e}"
+                    )
+                events = []
+            else:
+                response_cache.invalidate(ENROLLMENTS, uid)
+
+        # Notify live subscribers
+        for topic, event_type, data in events:
+            broker.publish(topic, event_type, data)
+
+        logger.info(
+            "Ran batch of %s operations (%s writes) for user %s",
+            len(operations),
+            len(written),
+            uid,
+        )
+        return {"results": results}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Failed to run batch: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to run batch: {e}",
+        )
@@ -0,0 +1,81 @@
+"""Server-Sent Events stream of live progress and family activity."""
+
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from app.core.events import HEARTBEAT_SECONDS, broker
+from app.core.security import get_current_user
+from app.db.firestore import get_firestore_client
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Create router
+router = APIRouter()
+
+
+def _family_uids(uid: str) -> set:
+    """Uids of the family members stored on ``family/{uid}``."""
+    db = get_firestore_client()
+    family_doc = db.collection("family").document(uid).get()
+    members = family_doc.to_dict().get("members", []) if family_doc.exists else []
+    return {member.get("uid") for member in members if member.get("uid")}
+
+
+async def _event_stream(request: Request, uid: str, topics: set):
+    """Subscribe, then yield SSE messages until the client disconnects."""
+    # Subscribing here rather than in the route ties the subscription to
+    # this generator: if the response never starts, nothing is left behind
+    subscription = broker.subscribe(uid, topics)
+    logger.info("Event stream opened for user %s following %s users", uid, len(topics))
+    try:
+        # Tell the client how long to wait before reconnecting
+        yield "retry: 5000\n\n"
+        while not await request.is_disconnected():
+            event = await subscription.get(timeout=HEARTBEAT_SECONDS)
+            if event is None:
+                # Heartbeat keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+
+            # Follow newly linked family members from now on. Only links of
+            # the subscriber itself count, and only once Firestore has them:
+            # a family event relayed from a member's topic must not make the
+            # subscriber follow someone outside its own family.
+            if event.type == "family" and event.topic == subscription.uid:
+                member_uid = event.data.get("memberUid")
+                if member_uid and member_uid in await run_in_threadpool(
+                    _family_uids, subscription.uid
+                ):
+                    broker.add_topic(subscription, member_uid)
+
+            yield event.to_sse()
+    finally:
+        broker.unsubscribe(subscription)
+        logger.info("Event stream closed for user %s", subscription.uid)
+
+
+@router.get("/events")
+async def stream_events(request: Request, current_user=Depends(get_current_user)):
+    """
+    Streams progress, enrollment and family events for the authenticated
+    user and their family members as Server-Sent Events.
+    """
+    uid = current_user.get("uid")
+    if not uid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found in token.",
+        )
+
+    # One read to find whose activity this connection follows
+    topics = {uid} | await run_in_threadpool(_family_uids, uid)
+
+    return StreamingResponse(
+        _event_stream(request, uid, topics),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -9,8 +9,23 @@ from typing import Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from firebase_admin import firestore
 
+from app.core import tracing
+from app.core.cache import FAMILY, PROFILE, response_cache
+from app.core.events import broker
+from app.core.rate_limit import rate_limit
 from app.core.security import get_current_user
+from app.db import family, invitations
+from app.db.email_index import email_index
 from app.db.firestore import get_firestore_client
+from app.core.request_body import json_body
+from app.schemas.profile import (
+    FamilyMember,
+    FamilyMemberDetails,
+    FamilyRequest,
+    InvitationAccept,
+    SettingsUpdate,
+    UserProfile,
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -27,13 +42,13 @@ EMAIL_PASSWORD = os.environ.get(
 )  # Set in environment variables for security
 
 
-@router.get("")
+@router.get("", response_model=UserProfile)
 async def get_user_profile(current_user=Depends(get_current_user)):
     """
     Retrieves the authenticated user's profile from Firestore.
     Creates a default profile if it doesn't exist.
     """
-    print(f"Backend: GET /settings - Authenticated user UID: {current_user.get('uid')}")
+    logger.debug("GET /settings for user %s", current_user.get("uid"))
     try:
         uid = current_user.get("uid")
         if not uid:
@@ -43,26 +58,39 @@ async def get_user_profile(current_user=Depends(get_current_user)):
                 detail="User ID not found in token.",
             )
 
+        # Repeat loads are served from the per-user cache
+        cached = response_cache.get(PROFILE, uid)
+        if cached is not None:
+            return cached
+
         db = get_firestore_client()
 
         # Get user profile from Firestore
         profile_ref = db.collection("users").document(uid)
-        profile_doc = profile_ref.get()
+        with tracing.firestore_span("get", "users"):
+            profile_doc = profile_ref.get()
 
         if not profile_doc.exists:
             # Create default profile if it doesn't exist
-            profile_ref.set(current_user)
-            logger.info(f"Created default profile for user {uid}")
+            with tracing.firestore_span("set", "users"):
+                profile_ref.set(current_user)
+            response_cache.set(PROFILE, uid, current_user)
+            email_index.remember(current_user.get("email"), uid)
+            logger.info("Created default profile for user %s", uid)
             return current_user
 
-        logger.info(f"Retrieved profile for user {uid}")
-        return profile_doc.to_dict()
+        profile = profile_doc.to_dict()
+        response_cache.set(PROFILE, uid, profile)
+        logger.info("Retrieved profile for user %s", uid)
+        return profile
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(
-            f"Failed to retrieve user profile for UID {current_user.get('uid')}: {e}",
+            "Failed to retrieve user profile for UID %s: %s",
+            current_user.get("uid"),
+            e,
             exc_info=True,
         )
         raise HTTPException(
@@ -71,33 +99,39 @@ async def get_user_profile(current_user=Depends(get_current_user)):
         )
 
 
-@router.put("")
-async def update_settings(request: Request, current_user=Depends(get_current_user)):
+@router.put("", dependencies=[Depends(rate_limit("settings"))])
+async def update_settings(
+    settings_update: SettingsUpdate = Depends(json_body(SettingsUpdate)),
+    current_user=Depends(get_current_user),
+):
     """
     Updates the authenticated user's profile in Firestore.
     """
-    print(f"Backend: PUT /settings - Authenticated user UID: {current_user.get('uid')}")
+    logger.debug("PUT /settings for user %s", current_user.get("uid"))
     try:
-        data = await request.json()
         db = get_firestore_client()
         user_id = current_user["uid"]
 
-        update_data = {}
-        if "name" in data:
-            update_data["name"] = data["name"]
-        if "email" in data:
-            update_data["email"] = data["email"]
+        # Only the fields sent by the client are updated
+        update_data = settings_update.model_dump(exclude_unset=True)
 
         if not update_data:
             raise HTTPException(status_code=400, detail="No data provided for update.")
 
         doc_ref = db.collection("users").document(user_id)
-        doc_ref.set(update_data, merge=True)
-        logger.info(f"Updated profile for user {user_id} with data: {update_data}")
+        with tracing.firestore_span("set", "users"):
+            doc_ref.set(update_data, merge=True)
+        response_cache.invalidate(PROFILE, user_id)
+        email_index.remember(update_data.get("email"), user_id)
+        logger.info("Updated profile for user %s with data: %s", user_id, update_data)
         return {"message": "Profile updated."}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(
-            f"Failed to update profile for user {current_user.get('uid')}: {e}",
+            "Failed to update profile for user %s: %s",
+            current_user.get("uid"),
+            e,
             exc_info=True,
         )
         raise HTTPException(
@@ -106,26 +140,18 @@ async def update_settings(request: Request, current_user=Depends(get_current_use
         )
 
 
-@router.post("/family-request")
+@router.post("/family-request", dependencies=[Depends(rate_limit("family-request"))])
 async def send_family_request(
-    request: Request, authenticated_user=Depends(get_current_user)
+    family_request: FamilyRequest = Depends(json_body(FamilyRequest)),
+    authenticated_user=Depends(get_current_user),
 ):
     """
     Sends a family linking request email to a specified recipient.
     """
-    print(
-        f"Backend: POST /family-request - Authenticated sender UID: {authenticated_user.get('uid')}"
-    )
-
-    # Read the request body
-    data = await request.json()
-    recipient_email = data.get("email")
+    logger.debug("POST /family-request from user %s", authenticated_user.get("uid"))
 
-    if not recipient_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Recipient email is required.",
-        )
+    # The body is validated while parsing; email must be non-empty
+    recipient_email = family_request.email
 
     # Prevent user from sending invitation to themselves
     sender_email = authenticated_user.get("email")
@@ -136,12 +162,8 @@ async def send_family_request(
         )
 
     # Check if recipient email exists in database
-    recipient_uid = None
     db = get_firestore_client()
-    for doc in db.collection("users").list_documents():
-        profile_doc = doc.get()
-        if recipient_email == profile_doc.get("email"):
-            recipient_uid = profile_doc.get("uid")
+    recipient_uid = email_index.lookup(db, recipient_email)
 
     if recipient_uid is None:
         raise HTTPException(
@@ -151,7 +173,8 @@ async def send_family_request(
 
     # Get sender's name
     sender_uid = authenticated_user["uid"]
-    sender_doc = db.collection("users").document(sender_uid).get()
+    with tracing.firestore_span("get", "users"):
+        sender_doc = db.collection("users").document(sender_uid).get()
 
     sender_name = "A user"  # Default name
     if sender_doc.exists:
@@ -160,20 +183,14 @@ async def send_family_request(
             "name", authenticated_user.get("displayName", "A user")
         )
 
-    print(f"Backend: Sending family request to {recipient_email} from {sender_name}")
+    logger.info("Sending family request to %s from %s", recipient_email, sender_name)
 
+    token = None
+    keep_invitation = False
     try:
-        # Generate a token for the invitation
-        token = os.urandom(16).hex()
-        invitation_ref = db.collection("invitations").document(token)
-        invitation_ref.set(
-            {
-                "sender_uid": sender_uid,
-                "recipient_uid": recipient_uid,
-                "recipient_email": recipient_email,
-                "status": "pending",
-                "created_at": firestore.SERVER_TIMESTAMP,
-            }
+        # Create the invitation, unless one to this recipient is still pending
+        token = invitations.create_invitation(
+            db, sender_uid, recipient_uid, recipient_email
         )
 
         # Create the accept URL
@@ -199,17 +216,30 @@ async def send_family_request(
         # Send email
         if not EMAIL_PASSWORD:
             logger.warning("EMAIL_PASSWORD not set. Email sending skipped.")
+            # Deployments without SMTP still create acceptable invitations
+            keep_invitation = True
             return {
                 "message": "Family request processed (email delivery skipped - no password set)"
             }
 
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, EMAIL_PASSWORD)
-            server.sendmail(SENDER_EMAIL, [recipient_email], msg.as_string())
-
+        message = msg.as_string()
+        with tracing.start_span(
+            "smtp.send",
+            {"smtp.server": SMTP_SERVER, "smtp.bytes": len(message)},
+        ):
+            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+                server.starttls()
+                server.login(SENDER_EMAIL, EMAIL_PASSWORD)
+                server.sendmail(SENDER_EMAIL, [recipient_email], message)
+
+        keep_invitation = True
         return {"message": "Family request email sent successfully."}
 
+    except invitations.DuplicateInvitation:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="An invitation to this user is already pending.",
+        )
     except smtplib.SMTPAuthenticationError:
         logger.error(
             "SMTP Authentication failed. Check SENDER_EMAIL and EMAIL_PASSWORD environment variables.",
@@ -220,38 +250,41 @@ async def send_family_request(
             detail="Failed to authenticate with email server. Please check credentials.",
         )
     except smtplib.SMTPException as e:
-        logger.error(f"SMTP error occurred while sending email: {e}", exc_info=True)
+        logger.error("SMTP error occurred while sending email: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to send email: {e}",
         )
     except Exception as e:
-        logger.error(f"Unexpected error while sending email: {e}", exc_info=True)
+        logger.error("Unexpected error while sending email: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while sending email.",
         )
-
-
-@router.post("/accept-invitation")
-async def accept_invitation(request: Request):
+    finally:
+        # An invitation nobody was told about must not block the next request
+        if token is not None and not keep_invitation:
+            invitations.cancel_invitation(db, token, sender_uid, recipient_uid)
+
+
+@router.post(
+    "/accept-invitation",
+    dependencies=[Depends(rate_limit("accept-invitation", per_user=False))],
+)
+async def accept_invitation(
+    invitation: InvitationAccept = Depends(json_body(InvitationAccept)),
+):
     """
     Accepts a family linking request and creates a family document in Firestore.
     """
-    data = await request.json()
-    token = data.get("token")
-
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invitation token is required.",
-        )
+    token = invitation.token
 
     db = get_firestore_client()
 
     # Get the invitation data
     invitation_ref = db.collection("invitations").document(token)
-    invitation_doc = invitation_ref.get()
+    with tracing.firestore_span("get", "invitations"):
+        invitation_doc = invitation_ref.get()
 
     if not invitation_doc.exists:
         raise HTTPException(
@@ -265,6 +298,12 @@ async def accept_invitation(request: Request):
     if invitation_data.get("status") == "accepted":
         return {"message": "Invitation was already accepted."}
 
+    if invitations.is_expired(invitation_data):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Invitation has expired.",
+        )
+
     # Get sender and recipient data
     sender_uid = invitation_data.get("sender_uid")
     recipient_uid = invitation_data.get("recipient_uid")
@@ -274,37 +313,56 @@ async def accept_invitation(request: Request):
     sender_family_ref = db.collection("family").document(sender_uid)
 
     # Add recipient to sender's family
-    sender_family_ref.set(
-        {
-            "members": firestore.ArrayUnion(
-                [{"email": recipient_email, "uid": recipient_uid}]
-            )
-        },
-        merge=True,
-    )
+    with tracing.firestore_span("set", "family"):
+        sender_family_ref.set(
+            {
+                "members": firestore.ArrayUnion(
+                    [{"email": recipient_email, "uid": recipient_uid}]
+                )
+            },
+            merge=True,
+        )
 
     # Create/update family connection for recipient
     recipient_family_ref = db.collection("family").document(recipient_uid)
 
     # Get sender's email
-    sender_doc = db.collection("users").document(sender_uid).get()
+    with tracing.firestore_span("get", "users"):
+        sender_doc = db.collection("users").document(sender_uid).get()
     sender_email = sender_doc.to_dict().get("email", "")
 
     # Add sender to recipient's family
-    recipient_family_ref.set(
-        {"members": firestore.ArrayUnion([{"email": sender_email, "uid": sender_uid}])},
-        merge=True,
-    )
+    with tracing.firestore_span("set", "family"):
+        recipient_family_ref.set(
+            {
+                "members": firestore.ArrayUnion(
+                    [{"email": sender_email, "uid": sender_uid}]
+                )
+            },
+            merge=True,
+        )
 
-    # Update invitation status
-    invitation_ref.update(
-        {"status": "accepted", "accepted_at": firestore.SERVER_TIMESTAMP}
+    # Update invitation status and free the pair for new invitations
+    batch = db.batch()
+    batch.update(
+        invitation_ref,
+        {"status": "accepted", "accepted_at": firestore.SERVER_TIMESTAMP},
     )
+    batch.delete(invitations.index_ref(db, sender_uid, recipient_uid))
+    with tracing.firestore_span("batch", "invitations", doc_count=2):
+        batch.commit()
+
+    response_cache.invalidate(PROFILE, sender_uid, recipient_uid)
+    response_cache.invalidate(FAMILY, sender_uid, recipient_uid)
+
+    # Let both sides' live streams start following each other
+    broker.publish(sender_uid, "family", {"memberUid": recipient_uid})
+    broker.publish(recipient_uid, "family", {"memberUid": sender_uid})
 
     return {"message": "Family invitation accepted successfully."}
 
 
-@router.get("/family-members")
+@router.get("/family-members", response_model=List[FamilyMember])
 async def get_family_members(current_user=Depends(get_current_user)):
     """
     Retrieves the family members of the authenticated user.
@@ -320,7 +378,8 @@ async def get_family_members(current_user=Depends(get_current_user)):
 
     # Get family document
     family_ref = db.collection("family").document(current_user_uid)
-    family_doc = family_ref.get()
+    with tracing.firestore_span("get", "family"):
+        family_doc = family_ref.get()
 
     if family_doc.exists:
         family_data = family_doc.to_dict()
@@ -328,3 +387,34 @@ async def get_family_members(current_user=Depends(get_current_user)):
         return members
     else:
         return []
+
+
+@router.get("/family", response_model=List[FamilyMemberDetails])
+async def get_family(current_user=Depends(get_current_user)):
+    """
+    Retrieves the family members of the authenticated user with each
+    member's name, picture and enrollment summary, in a fixed number of
+    reads. Results are cached per user; accepting an invitation refreshes
+    both families, other changes show up within the cache TTL.
+    """
+    try:
+        uid = current_user.get("uid")
+        if not uid:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User ID not found in token.",
+            )
+
+        db = get_firestore_client()
+        members = family.get_family(db, uid)
+        logger.info("Retrieved %s family members for user %s", len(members), uid)
+        return members
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Failed to retrieve family: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve family: {e}",
+        )
@@ -0,0 +1,43 @@
+"""Pydantic schemas for the batch API requests and responses."""
+
+from typing import Any, List, Literal, Optional, Union
+
+from pydantic import BaseModel, Field, StrictFloat, StrictInt
+
+# Each write operation takes at most two of Firestore's 500 batch operations
+MAX_BATCH_OPERATIONS = 50
+
+
+class BatchOperation(BaseModel):
+    """One sub-operation of a batch request."""
+
+    # Echoed back so clients can match results to operations
+    id: Optional[str] = None
+    op: Literal["get_course", "enroll", "update_progress"]
+    courseId: str = Field(..., min_length=1)
+    progress: Optional[Union[StrictInt, StrictFloat]] = Field(None, ge=0, le=100)
+    completed: bool = False
+
+
+class BatchRequest(BaseModel):
+    """Batch request body."""
+
+    operations: List[BatchOperation] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_OPERATIONS
+    )
+
+
+class BatchResult(BaseModel):
+    """Outcome of one sub-operation, with an HTTP-style status code."""
+
+    id: Optional[str] = None
+    op: str
+    status: int
+    data: Optional[Any] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    """Batch response schema, results in request order."""
+
+    results: List[BatchResult]
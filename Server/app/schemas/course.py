@@ -0,0 +1,116 @@
+"""Pydantic schemas for course and enrollment requests and responses."""
+
+from datetime import datetime
+from typing import Any, List, Optional, Union
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    StrictFloat,
+    StrictInt,
+    field_validator,
+)
+
+
+class CourseStats(BaseModel):
+    """Materialized enrollment statistics of a course."""
+
+    enrolled: int = 0
+    completed: int = 0
+    averageProgress: float = 0.0
+
+
+class Course(BaseModel):
+    """Course response schema."""
+
+    # Course documents may carry extra fields; pass them through unchanged
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    author: Optional[str] = None
+    duration: Optional[Union[int, float, str]] = None
+    level: Optional[str] = None
+    topics: List[str] = []
+    imageUrl: Optional[str] = None
+    createdAt: Optional[datetime] = None
+    updatedAt: Optional[datetime] = None
+    stats: Optional[CourseStats] = None
+
+    # Legacy course documents may hold null or a single string for topics
+    # and non-string text fields; coerce them rather than fail the catalog
+    @field_validator(
+        "title", "description", "author", "level", "imageUrl", mode="before"
+    )
+    @classmethod
+    def _coerce_text(cls, value: Any) -> Any:
+        if value is None or isinstance(value, str):
+            return value
+        return str(value)
+
+    @field_validator("topics", mode="before")
+    @classmethod
+    def _coerce_topics(cls, value: Any) -> Any:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, (list, tuple)):
+            return [str(topic) for topic in value if topic is not None]
+        return []
+
+
+class Enrollment(BaseModel):
+    """Enrollment with its course, as listed for the current user."""
+
+    enrollmentId: str
+    progress: float = 0
+    completed: bool = False
+    enrolledAt: Optional[datetime] = None
+    lastAccessed: Optional[datetime] = None
+    course: Course
+
+
+class CourseCreate(BaseModel):
+    """Course creation request schema."""
+
+    model_config = ConfigDict(extra="allow")
+
+    title: str
+    description: str
+    author: str
+    duration: Union[int, float, str]
+    level: Optional[str] = None
+    topics: List[str] = []
+    imageUrl: Optional[str] = None
+
+
+class CourseUpdate(BaseModel):
+    """Course update request schema; only the fields sent are written."""
+
+    model_config = ConfigDict(extra="allow")
+
+    title: Optional[str] = None
+    description: Optional[str] = None
+    author: Optional[str] = None
+    duration: Optional[Union[int, float, str]] = None
+    level: Optional[str] = None
+    topics: Optional[List[str]] = None
+    imageUrl: Optional[str] = None
+
+
+class ProgressUpdate(BaseModel):
+    """Course progress update request schema."""
+
+    progress: Union[StrictInt, StrictFloat] = Field(..., ge=0, le=100)
+    completed: bool = False
+
+
+class CohortEnrollment(BaseModel):
+    """Bulk enrollment request schema; learners by uid and/or email."""
+
+    uids: List[str] = Field([], max_length=5000)
+    emails: List[str] = Field([], max_length=5000)
+    courseIds: List[str] = Field(..., min_length=1, max_length=50)
@@ -0,0 +1,61 @@
+"""Pydantic schemas for Firestore user profile and family requests and responses."""
+
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class UserProfile(BaseModel):
+    """Firestore user profile response schema."""
+
+    # Profiles start as a copy of the decoded token, so keep every claim
+    model_config = ConfigDict(extra="allow")
+
+    uid: Optional[str] = None
+    email: Optional[str] = None
+    name: Optional[str] = None
+
+
+class FamilyMember(BaseModel):
+    """Linked family member response schema."""
+
+    email: Optional[str] = None
+    # Entries linked before members carried a uid only have an email
+    uid: Optional[str] = None
+
+
+class FamilyProgress(BaseModel):
+    """Enrollment summary of a family member."""
+
+    enrolled: int = 0
+    completed: int = 0
+    averageProgress: float = 0
+    lastAccessed: Optional[datetime] = None
+
+
+class FamilyMemberDetails(FamilyMember):
+    """Family member with profile and progress, as returned by /family."""
+
+    name: Optional[str] = None
+    picture: Optional[str] = None
+    progress: FamilyProgress = FamilyProgress()
+
+
+class SettingsUpdate(BaseModel):
+    """Profile update request schema."""
+
+    name: Optional[str] = None
+    email: Optional[str] = None
+
+
+class FamilyRequest(BaseModel):
+    """Family linking request schema."""
+
+    email: str = Field(..., min_length=1)
+
+
+class InvitationAccept(BaseModel):
+    """Family invitation acceptance schema."""
+
+    token: str = Field(..., min_length=1)
@@ -0,0 +1 @@
+"""Micro-benchmarks for the AI Academy server, run as ``python -m benchmarks.<name>``."""
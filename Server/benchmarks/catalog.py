@@ -0,0 +1,78 @@
+"""Realistic course catalog and enrollment payloads for the benchmarks."""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+TITLES = [
+    "Introduction to AI and Machine Learning",
+    "Python for Data Science",
+    "Deep Learning with TensorFlow",
+    "Natural Language Processing Fundamentals",
+    "Computer Vision with OpenCV",
+]
+AUTHORS = ["Dr. Alan Turing", "Grace Harper", "Ada Lovelace"]
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+TOPICS = [
+    "AI",
+    "Machine Learning",
+    "Data Science",
+    "Python",
+    "Data Analysis",
+    "Visualization",
+    "Deep Learning",
+    "TensorFlow",
+    "Neural Networks",
+    "NLP",
+    "Computer Vision",
+]
+
+PAYLOAD_SIZES = (10, 100, 1000)
+
+
+def make_course(index: int, rng: random.Random) -> dict:
+    """One course shaped like the documents written by initialize_courses.py."""
+    created = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(hours=index)
+    return {
+        "id": f"course{index:06d}",
+        "title": f"{rng.choice(TITLES)} {index}",
+        "description": (
+            "Learn the fundamentals of AI and machine learning concepts, "
+            "algorithms, and applications through hands-on projects."
+        ),
+        "author": rng.choice(AUTHORS),
+        "duration": rng.choice([90, 120, 150, 180, 240]),
+        "level": rng.choice(LEVELS),
+        "topics": rng.sample(TOPICS, 3),
+        "imageUrl": f"https://images.unsplash.com/photo-{1677442136019 + index}",
+        "createdAt": created,
+        "stats": {
+            "enrolled": rng.randint(0, 5000),
+            "completed": rng.randint(0, 500),
+            "averageProgress": round(rng.uniform(0, 100), 2),
+        },
+    }
+
+
+def make_catalog(count: int, seed: int = 42) -> list:
+    """A list of ``count`` courses, as returned by GET /api/courses."""
+    rng = random.Random(seed)
+    return [make_course(i, rng) for i in range(count)]
+
+
+def make_enrollments(count: int, seed: int = 42) -> list:
+    """A list of ``count`` enrollments, as returned by GET /api/enrollments."""
+    rng = random.Random(seed)
+    enrollments = []
+    for i in range(count):
+        course = make_course(i, rng)
+        enrollments.append(
+            {
+                "enrollmentId": f"user123_{course['id']}",
+                "progress": rng.randint(0, 100),
+                "completed": rng.random() < 0.2,
+                "enrolledAt": course["createdAt"],
+                "lastAccessed": course["createdAt"] + timedelta(days=3),
+                "course": course,
+            }
+        )
+    return enrollments
@@ -0,0 +1,44 @@
+"""
+Measure bandwidth and latency of response compression on catalog payloads.
+
+    python -m benchmarks.compression
+
+For each payload size and available encoding, prints the compressed size,
+the saving against identity, and the mean time to compress the body.
+"""
+
+import json
+import time
+
+from app.core.compression import STREAMS, compress_body
+from benchmarks.catalog import PAYLOAD_SIZES, make_catalog, make_enrollments
+
+REPEAT = 20
+
+
+def measure(encoding: str, body: bytes) -> tuple:
+    """Return (compressed size, mean milliseconds per compression)."""
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        compressed = compress_body(encoding, body)
+    elapsed = (time.perf_counter() - started) / REPEAT
+    return len(compressed), elapsed * 1000
+
+
+def main():
+    print(f"{'payload':<20}{'encoding':<10}{'bytes':>10}{'saved':>8}{'ms':>9}")
+    for name, builder in (("courses", make_catalog), ("enrollments", make_enrollments)):
+        for size in PAYLOAD_SIZES:
+            body = json.dumps(builder(size), default=str).encode()
+            label = f"{name} x{size}"
+            print(f"{label:<20}{'identity':<10}{len(body):>10}{'-':>8}{0:>9.3f}")
+            for encoding in STREAMS:
+                compressed_size, ms = measure(encoding, body)
+                saved = 1 - compressed_size / len(body)
+                print(
+                    f"{label:<20}{encoding:<10}{compressed_size:>10}{saved:>8.1%}{ms:>9.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Check that importing the app is fast and has no side effects.
+
+    python -m benchmarks.import_time
+
+Imports ``app.main`` in a fresh interpreter under ``-X importtime``, prints
+the slowest modules by cumulative time, and exits non-zero when the total
+exceeds ``IMPORT_BUDGET_MS`` or when the import initialized Firebase or
+pulled in a module that should only load on first use. The same check runs
+in the test suite (``tests/test_import_time.py``).
+"""
+
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "1500"))
+TOP = 15
+
+# Loaded lazily by the code that needs them, never by importing the app
+LAZY_MODULES = ("jose", "passlib", "sqlalchemy", "jinja2", "uvicorn")
+
+PROBE = f"""
+import sys
+import app.main
+import firebase_admin
+print(len(firebase_admin._apps))
+print(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))
+"""
+
+
+def run_import() -> tuple:
+    """Return (stdout lines, [(cumulative us, self us, module)]) of one import."""
+    server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=server_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing app.main failed:\n{result.stderr}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        timings.append((int(cumulative_us), int(self_us), module.rstrip()))
+    return result.stdout.splitlines(), timings
+
+
+def check(output: list, timings: list) -> tuple:
+    """Return (total ms, [failure messages]) of one import."""
+    initialized_apps, loaded_lazy = output[-2], output[-1]
+    # Top-level imports are the ones with no indentation after the bar
+    total_ms = sum(cum for cum, _, module in timings if not module.startswith("  "))
+    total_ms /= 1000
+
+    failures = []
+    if total_ms > IMPORT_BUDGET_MS:
+        failures.append(f"import took {total_ms:.1f} ms")
+    if initialized_apps != "0":
+        failures.append("importing the app initialized Firebase")
+    if loaded_lazy:
+        failures.append(f"importing the app loaded {loaded_lazy}")
+    return total_ms, failures
+
+
+def main():
+    output, timings = run_import()
+    total_ms, failures = check(output, timings)
+
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative_us, self_us, module in sorted(timings, reverse=True)[:TOP]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f} {module}")
+    print(f"\nTotal import time: {total_ms:.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measure JSON serialization time of API payloads per payload size.
+
+    python -m benchmarks.serialization
+
+Compares the previous path (``jsonable_encoder`` + ``json.dumps``) with the
+typed path used by the routes now (Pydantic response model + the
+``FirestoreJSONResponse`` encoder), and with the encoder alone.
+"""
+
+import json
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.core.responses import dumps, orjson_available
+from app.schemas.course import Course, Enrollment
+from benchmarks.catalog import PAYLOAD_SIZES, make_catalog, make_enrollments
+
+REPEAT = 20
+
+
+def timed(func, payload) -> float:
+    """Mean milliseconds per call."""
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        func(payload)
+    return (time.perf_counter() - started) / REPEAT * 1000
+
+
+def main():
+    print(f"encoder: {'orjson' if orjson_available else 'json'}")
+    print(f"{'payload':<20}{'jsonable+json':>15}{'model+fast':>13}{'fast only':>12}")
+    cases = (
+        ("courses", make_catalog, TypeAdapter(List[Course])),
+        ("enrollments", make_enrollments, TypeAdapter(List[Enrollment])),
+    )
+    for name, builder, adapter in cases:
+        for size in PAYLOAD_SIZES:
+            payload = builder(size)
+            baseline = timed(lambda p: json.dumps(jsonable_encoder(p)), payload)
+            typed = timed(
+                lambda p: dumps(
+                    adapter.dump_python(adapter.validate_python(p), mode="json")
+                ),
+                payload,
+            )
+            fast = timed(dumps, payload)
+            label = f"{name} x{size}"
+            print(f"{label:<20}{baseline:>15.3f}{typed:>13.3f}{fast:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
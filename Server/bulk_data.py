@@ -0,0 +1,70 @@
+"""
+Export or import Firestore collections as NDJSON.
+
+Examples:
+    python bulk_data.py export --collections courses,enrollments -o backup.ndjson
+    python bulk_data.py import backup.ndjson --checkpoint backup.checkpoint
+
+An interrupted import can be resumed by running it again with the same
+checkpoint file.
+"""
+
+import argparse
+import sys
+
+from app.db import bulk
+from app.db.firestore import get_firestore_client
+
+
+def run_export(args):
+    """Write the requested collections to a file or stdout."""
+    db = get_firestore_client()
+    collections = [name.strip() for name in args.collections.split(",")]
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for line in bulk.export_ndjson(db, collections, page_size=args.page_size):
+            out.write(line)
+    finally:
+        if args.output:
+            out.close()
+
+
+def run_import(args):
+    """Load an NDJSON file through parallel batched writes."""
+    db = get_firestore_client()
+    importer = bulk.NDJSONImporter(
+        db,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+        checkpoint_path=args.checkpoint,
+    )
+    try:
+        with open(args.input, "rb") as f:
+            importer.add_lines(f)
+        imported = importer.close()
+    finally:
+        importer.abort()
+    print(f"Imported {imported} documents from {args.input}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Dump collections as NDJSON")
+    export_parser.add_argument(
+        "--collections", default=",".join(bulk.EXPORTABLE_COLLECTIONS)
+    )
+    export_parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    export_parser.add_argument("--page-size", type=int, default=bulk.DEFAULT_PAGE_SIZE)
+    export_parser.set_defaults(func=run_export)
+
+    import_parser = subparsers.add_parser("import", help="Load an NDJSON dump")
+    import_parser.add_argument("input", help="NDJSON file to import")
+    import_parser.add_argument("--checkpoint", help="Checkpoint file for resuming")
+    import_parser.add_argument("--batch-size", type=int, default=bulk.MAX_BATCH_SIZE)
+    import_parser.add_argument("--workers", type=int, default=bulk.DEFAULT_WORKERS)
+    import_parser.set_defaults(func=run_import)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -86,11 +86,14 @@ def add_sample_courses():
     """Add sample courses to Firestore."""
     print("Adding sample courses to Firestore...")
 
+    # Write all courses in a single batched commit
+    batch = db.batch()
     for course in sample_courses:
         # Create a new course document with auto-generated ID
         new_course_ref = db.collection("courses").document()
-        new_course_ref.set(course)
-        print(f"Added course: {course['title']} (ID: {new_course_ref.id})")
+        batch.set(new_course_ref, course)
+        print(f"Queued course: {course['title']} (ID: {new_course_ref.id})")
+    batch.commit()
 
     print("Sample courses added successfully!")
 
@@ -98,7 +101,7 @@ def add_sample_courses():
 def check_existing_courses():
     """Check if there are already courses in the database."""
     courses_ref = db.collection("courses")
-    courses = list(courses_ref.stream())
+    courses = list(courses_ref.limit(1).stream())
     return len(courses) > 0
 
 
@@ -0,0 +1,120 @@
+"""Family links in the live event stream."""
+
+import asyncio
+
+from app.core.events import broker
+from app.routes import events
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeFirestore:
+    """Just enough of a Firestore client to read family documents."""
+
+    def __init__(self, families):
+        self.families = families
+
+    def collection(self, name):
+        assert name == "family"
+        return self
+
+    def document(self, uid):
+        members = self.families.get(uid)
+        data = None if members is None else {"members": members}
+        return type("Ref", (), {"get": lambda ref: FakeSnapshot(data)})()
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def _record_subscriptions(monkeypatch):
+    """Collect the subscriptions the streams create, by uid."""
+    subscriptions = {}
+    subscribe = broker.subscribe
+
+    def recording_subscribe(uid, topics):
+        subscriptions[uid] = subscribe(uid, topics)
+        return subscriptions[uid]
+
+    monkeypatch.setattr(broker, "subscribe", recording_subscribe)
+    return subscriptions
+
+
+async def _open(uid, topics):
+    """Start a stream; it subscribes before yielding its retry line."""
+    stream = events._event_stream(FakeRequest(), uid, topics)
+    await stream.__anext__()
+    return stream
+
+
+async def _consume(stream, count):
+    for _ in range(count):
+        await stream.__anext__()
+
+
+def test_family_event_relayed_to_third_party_does_not_follow(monkeypatch):
+    # A and B are linked; A then links to C, which B is not linked to
+    families = {
+        "a": [{"uid": "b", "email": "b@example.com"}, {"uid": "c"}],
+        "b": [{"uid": "a", "email": "a@example.com"}],
+        "c": [{"uid": "a"}],
+    }
+    monkeypatch.setattr(events, "get_firestore_client", lambda: FakeFirestore(families))
+    subscriptions = _record_subscriptions(monkeypatch)
+
+    async def scenario():
+        a = await _open("a", {"a", "b"})
+        b = await _open("b", {"b", "a"})
+        broker.publish("a", "family", {"memberUid": "c"})
+        broker.publish("c", "family", {"memberUid": "a"})
+        # A sees its own event; B sees A's event through the A topic
+        await asyncio.gather(_consume(a, 1), _consume(b, 1))
+        topics = subscriptions["a"].topics, subscriptions["b"].topics
+        await a.aclose()
+        await b.aclose()
+        return topics
+
+    a_topics, b_topics = asyncio.run(scenario())
+    assert "c" in a_topics
+    assert "c" not in b_topics
+
+
+def test_family_event_without_stored_link_does_not_follow(monkeypatch):
+    monkeypatch.setattr(events, "get_firestore_client", lambda: FakeFirestore({}))
+    subscriptions = _record_subscriptions(monkeypatch)
+
+    async def scenario():
+        a = await _open("a", {"a"})
+        broker.publish("a", "family", {"memberUid": "mallory"})
+        await _consume(a, 1)
+        await a.aclose()
+        return subscriptions["a"].topics
+
+    assert "mallory" not in asyncio.run(scenario())
+
+
+def test_stream_never_started_leaves_no_subscription():
+    stream = events._event_stream(FakeRequest(), "idle", {"idle"})
+    del stream
+
+    assert "idle" not in broker._subscribers
+
+
+def test_closed_stream_unsubscribes():
+    async def scenario():
+        stream = await _open("z", {"z"})
+        subscribed = "z" in broker._subscribers
+        await stream.aclose()
+        return subscribed
+
+    assert asyncio.run(scenario())
+    assert "z" not in broker._subscribers
@@ -0,0 +1,12 @@
+"""Importing the app stays within its budget and has no side effects."""
+
+from benchmarks import import_time
+
+
+def test_import_app_within_budget():
+    output, timings = import_time.run_import()
+
+    _, failures = import_time.check(output, timings)
+
+    budget = f"budget {import_time.IMPORT_BUDGET_MS:.0f} ms"
+    assert not failures, f"{'; '.join(failures)} ({budget})"
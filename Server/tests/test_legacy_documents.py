@@ -0,0 +1,76 @@
+"""Responses built from documents written before the current schemas."""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.security import get_current_user
+from app.routes import api, settings
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeFirestore:
+    """Just enough of a Firestore client to read one family document."""
+
+    def __init__(self, family):
+        self.family = family
+
+    def collection(self, name):
+        assert name == "family"
+        return self
+
+    def document(self, uid):
+        data = self.family
+        return type("Ref", (), {"get": lambda ref: FakeSnapshot(data)})()
+
+
+def _client():
+    app = FastAPI()
+    app.include_router(api.router, prefix="/api")
+    app.include_router(settings.router, prefix="/api/settings")
+    app.dependency_overrides[get_current_user] = lambda: {"uid": "a"}
+    return TestClient(app)
+
+
+def test_family_members_include_legacy_entry_without_uid(monkeypatch):
+    family = {
+        "members": [
+            {"uid": "b", "email": "b@example.com"},
+            {"email": "legacy@example.com"},
+        ]
+    }
+    monkeypatch.setattr(settings, "get_firestore_client", lambda: FakeFirestore(family))
+
+    response = _client().get("/api/settings/family-members")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"uid": "b", "email": "b@example.com"},
+        {"uid": None, "email": "legacy@example.com"},
+    ]
+
+
+def test_courses_coerce_legacy_topics_and_level(monkeypatch):
+    courses = [
+        {"id": "c1", "title": "Current", "level": "Beginner", "topics": ["ml"]},
+        {"id": "c2", "title": "Legacy", "level": 2, "topics": None},
+        {"id": "c3", "title": "Legacy", "topics": "nlp"},
+    ]
+    monkeypatch.setattr(api, "get_firestore_client", lambda: None)
+    monkeypatch.setattr(api.catalog, "get_catalog", lambda db: courses)
+
+    response = _client().get("/api/courses")
+
+    assert response.status_code == 200
+    body = {course["id"]: course for course in response.json()}
+    assert body["c1"]["topics"] == ["ml"]
+    assert body["c2"]["level"] == "2"
+    assert body["c2"]["topics"] == []
+    assert body["c3"]["topics"] == ["nlp"]